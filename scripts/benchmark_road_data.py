@@ -0,0 +1,637 @@
+"""
+Benchmarks for the road data generator (scripts/generate_road_data_colab.py)
+
+Everything runs offline: Overpass responses are generated synthetically and
+served by a local stand-in for the Overpass mirrors, so results are
+reproducible and a run takes minutes instead of hours.
+
+Usage from the command line:
+    python scripts/benchmark_road_data.py                        # All benchmarks
+    python scripts/benchmark_road_data.py --sizes small county   # Skip the Fairfax-scale fixture
+    python scripts/benchmark_road_data.py --stages-only          # No end-to-end runs
+    python scripts/benchmark_road_data.py --compare .benchmarks/abc1234.json
+    python scripts/benchmark_road_data.py --serve 8080           # Just run the stand-in server
+
+Results are written as JSON to .benchmarks/<commit>.json (see --output) so
+runs on different commits can be compared with --compare.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate_road_data_colab as gen  # noqa: E402
+
+
+# ============================================================
+# SYNTHETIC OVERPASS RESPONSES
+# ============================================================
+# Fixture sizes in ways, roughly a small independent city, a rural county
+# and Fairfax County for the highway types the generator requests
+FIXTURE_SIZES = {
+    'small': 400,
+    'county': 6000,
+    'fairfax': 30000,
+}
+
+# Share of each highway type among the requested ways (unclassified and
+# tertiary roads dominate, motorways are few but long)
+HIGHWAY_MIX = [
+    ('unclassified', 0.34), ('tertiary', 0.22), ('secondary', 0.14), ('primary', 0.09),
+    ('tertiary_link', 0.03), ('secondary_link', 0.03), ('primary_link', 0.04),
+    ('trunk', 0.03), ('trunk_link', 0.02), ('motorway', 0.02), ('motorway_link', 0.04),
+]
+
+FIXTURE_BBOX = [-77.5116, 38.5958, -77.0285, 39.0007]  # Fairfax County
+
+
+def synthetic_ways(count: int, bbox: List[float] = None, seed: int = 0,
+                   first_id: int = 1) -> List[Dict]:
+    """
+    Highway way elements (``out body geom``) spread over a bbox.
+
+    Vertex counts are log-normal (median ~9, long tail up to 400) and
+    geometries are random walks with 20-120 m steps. About a third of the
+    ways start at the end node of an earlier way, so junction handling
+    (shared nodes in the LOD files) gets exercised like real data; most of
+    those continue the earlier way's street with the same tags, the way
+    OSM splits a street at bridges and junctions (segment merging).
+    """
+    rnd = random.Random(seed)
+    west, south, east, north = bbox or FIXTURE_BBOX
+    types, weights = zip(*HIGHWAY_MIX)
+    ways = []
+    ends = []
+    next_node = first_id * 1000
+
+    for k in range(count):
+        highway = rnd.choices(types, weights)[0]
+        vertices = max(2, min(400, int(rnd.lognormvariate(2.2, 0.8))))
+        same_street = None
+
+        if ends and rnd.random() < 0.35:
+            node, lat, lon, prev_tags = ends[rnd.randrange(len(ends))]
+            nodes, geometry = [node], [{'lat': lat, 'lon': lon}]
+            if rnd.random() < 0.7:
+                same_street = prev_tags
+        else:
+            lat, lon = rnd.uniform(south, north), rnd.uniform(west, east)
+            nodes, geometry = [next_node], [{'lat': round(lat, 7), 'lon': round(lon, 7)}]
+            next_node += 1
+
+        heading = rnd.uniform(0, 2 * math.pi)
+        for _ in range(vertices - 1):
+            heading += rnd.gauss(0, 0.3)
+            step = rnd.uniform(20, 120) / 111000  # metres to degrees
+            lat += step * math.cos(heading)
+            lon += step * math.sin(heading) / math.cos(math.radians(lat))
+            nodes.append(next_node)
+            geometry.append({'lat': round(lat, 7), 'lon': round(lon, 7)})
+            next_node += 1
+
+        tags = {'highway': highway}
+        if rnd.random() < 0.8:
+            tags['name'] = f"{rnd.choice(['Oak', 'Lee', 'Mill', 'Church', 'Ridge', 'Main'])} " \
+                           f"{rnd.choice(['Road', 'Street', 'Highway', 'Pike', 'Drive'])} {k % 97}"
+        if highway.startswith(('motorway', 'trunk', 'primary')) and rnd.random() < 0.7:
+            tags['ref'] = f"{rnd.choice(['I', 'US', 'VA'])} {rnd.randint(1, 700)}"
+        if rnd.random() < 0.4:
+            tags['lanes'] = str(rnd.choice([1, 2, 2, 2, 3, 4]))
+        if rnd.random() < 0.5:
+            tags['maxspeed'] = f"{rnd.choice([25, 35, 45, 55, 65, 70])} mph"
+        if rnd.random() < 0.3:
+            tags['surface'] = rnd.choice(['asphalt', 'asphalt', 'concrete', 'gravel'])
+        if same_street is not None:
+            tags = dict(same_street)
+        ends.append((nodes[-1], geometry[-1]['lat'], geometry[-1]['lon'], tags))
+
+        ways.append({
+            'type': 'way',
+            'id': first_id + k,
+            'bounds': {
+                'minlat': min(p['lat'] for p in geometry), 'minlon': min(p['lon'] for p in geometry),
+                'maxlat': max(p['lat'] for p in geometry), 'maxlon': max(p['lon'] for p in geometry)
+            },
+            'nodes': nodes,
+            'geometry': geometry,
+            'tags': tags
+        })
+
+    return ways
+
+
+def synthetic_response(count: int, bbox: List[float] = None, seed: int = 0,
+                       first_id: int = 1) -> Dict:
+    """A complete Overpass JSON response holding synthetic_ways()."""
+    return {
+        'version': 0.6,
+        'generator': 'Overpass API (benchmark stand-in)',
+        'osm3s': {
+            'timestamp_osm_base': '2026-01-01T00:00:00Z',
+            'copyright': 'Synthetic data for benchmarks'
+        },
+        'elements': synthetic_ways(count, bbox, seed, first_id)
+    }
+
+
+# ============================================================
+# STAND-IN OVERPASS SERVER
+# ============================================================
+_BBOX_CLAUSE = re.compile(r'\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)')
+
+
+class StandInOverpass:
+    """
+    Local HTTP server that answers generator queries like an Overpass mirror.
+
+    Ways are generated per bbox clause in the query at ``ways_per_sq_degree``
+    (deterministically, so the same bbox always gets the same ways) and
+    responses are delayed by ``latency`` seconds plus up to ``jitter``.
+    ``failure_rate`` of the queries fail with one of ``failures``:
+    'http429', 'http504', 'http500', 'timeout' (sleeps ``timeout_sleep``
+    seconds before answering) or 'too_large' (an Overpass limit remark).
+    A ``dead`` server drops every connection without answering.
+    ``/api/status`` answers with ``status_text`` (free slots by default), and
+    ``out count`` probes get counts.
+    """
+
+    FAILURES = ('http429', 'http504', 'http500', 'timeout', 'too_large')
+    STATUS_FREE = 'Connected as: 1\nRate limit: 2\n2 slots available now.\n'
+
+    def __init__(self, ways_per_sq_degree: float = 50000, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, failures: List[str] = None, timeout_sleep: float = 5.0,
+                 dead: bool = False, status_text: str = None, seed: int = 0, port: int = 0):
+        self.ways_per_sq_degree = ways_per_sq_degree
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failures = list(failures or self.FAILURES)
+        self.timeout_sleep = timeout_sleep
+        self.dead = dead
+        self.status_text = status_text or self.STATUS_FREE
+        self.requests = 0
+        self.status_requests = 0
+        self.failed = 0
+        self.bytes_sent = 0
+        self._rnd = random.Random(seed)
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._bodies = {}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if not self.path.endswith('/status'):
+                    server._send(self, 404, b'', 'text/plain')
+                    return
+                with server._lock:
+                    server.status_requests += 1
+                if server.dead:
+                    server._drop(self)
+                else:
+                    server._send(self, 200, server.status_text.encode('utf-8'), 'text/plain')
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+                query = parse_qs(body).get('data', [''])[0]
+                server._answer(self, query)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/api/interpreter'
+        self._thread = None
+
+    def start(self) -> 'StandInOverpass':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _send(self, handler, status: int, body: bytes, content_type: str = 'application/json'):
+        try:
+            handler.send_response(status)
+            handler.send_header('Content-Type', content_type)
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            return  # client gave up (e.g. its timeout fired first)
+        with self._lock:
+            self.bytes_sent += len(body)
+
+    def _drop(self, handler):
+        # Close the connection without a status line, like a crashed mirror
+        handler.close_connection = True
+        try:
+            handler.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _ways_for(self, bbox: List[float]) -> List[Dict]:
+        key = tuple(bbox)
+        with self._lock:
+            if key not in self._bodies:
+                west, south, east, north = bbox
+                count = max(1, int((east - west) * (north - south) * self.ways_per_sq_degree))
+                # Stable ids per bbox so overlapping queries share nothing by accident
+                seed = hash((self._seed,) + key) & 0xffffffff
+                self._bodies[key] = synthetic_ways(count, bbox, seed=seed, first_id=1 + (seed % 10 ** 6) * 1000)
+            return self._bodies[key]
+
+    def _answer(self, handler, query: str):
+        with self._lock:
+            self.requests += 1
+            failure = self._rnd.choice(self.failures) if self._rnd.random() < self.failure_rate else None
+            delay = self.latency + self._rnd.uniform(0, self.jitter)
+            if failure or self.dead:
+                self.failed += 1
+        if self.dead:
+            self._drop(handler)
+            return
+        time.sleep(delay)
+
+        if failure == 'timeout':
+            time.sleep(self.timeout_sleep)
+        elif failure in ('http429', 'http504', 'http500'):
+            self._send(handler, int(failure[4:]), b'{"error": "injected failure"}')
+            return
+        elif failure == 'too_large':
+            body = {'elements': [], 'remark': 'runtime error: Query run out of memory using about 2048 MB of RAM.'}
+            self._send(handler, 200, json.dumps(body).encode('utf-8'))
+            return
+
+        # south, west, north, east in Overpass QL order
+        bboxes = sorted({(float(w), float(s), float(e), float(n))
+                         for s, w, n, e in _BBOX_CLAUSE.findall(query)})
+        ways = {}
+        for bbox in bboxes:
+            for way in self._ways_for(list(bbox)):
+                ways[way['id']] = way
+
+        if 'out count' in query:
+            counts = [len(ways), 0, 0]
+            elements = [{'type': 'count', 'id': 0, 'tags': {'total': str(c)}} for c in counts]
+        else:
+            elements = list(ways.values())
+
+        body = {
+            'version': 0.6,
+            'osm3s': {'timestamp_osm_base': '2026-01-01T00:00:00Z'},
+            'elements': elements
+        }
+        self._send(handler, 200, json.dumps(body).encode('utf-8'))
+
+
+# ============================================================
+# MEASUREMENT
+# ============================================================
+def measure(fn: Callable, repeat: int = 5, setup: Callable = None, memory: bool = True) -> Dict:
+    """
+    Time ``fn`` ``repeat`` times (after an untimed warm-up) and measure its peak memory.
+
+    ``setup`` runs before every call, untimed, and its return value is
+    passed to ``fn``. Memory is the tracemalloc peak of one extra call, so
+    tracing does not slow the timed calls down.
+    """
+    def call():
+        arg = setup() if setup else None
+        gc.collect()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(arg) if setup else fn()
+        return time.perf_counter() - started
+
+    call()
+    times = sorted(call() for _ in range(repeat))
+    result = {
+        'min': round(times[0], 6),
+        'median': round(times[len(times) // 2], 6),
+        'max': round(times[-1], 6),
+        'repeat': repeat
+    }
+
+    if memory:
+        arg = setup() if setup else None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn(arg) if setup else fn()
+            result['peakBytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def stage_benchmarks(size: str, repeat: int) -> Dict[str, Dict]:
+    """Time each processing and writing stage on one synthetic fixture."""
+    response = synthetic_response(FIXTURE_SIZES[size], seed=1)
+    raw = json.dumps(response).encode('utf-8')
+    elements = response['elements']
+    coords = [[[p['lat'], p['lon']] for p in el['geometry']] for el in elements]
+    data = gen.process_road_data(response, 'fairfax')
+    ways = len(elements)
+    vertices = sum(len(c) for c in coords)
+    results = {}
+
+    work = tempfile.mkdtemp(prefix='road_bench_')
+    try:
+        response_path = os.path.join(work, 'response.json')
+        with open(response_path, 'wb') as f:
+            f.write(raw)
+
+        def fresh_dir():
+            path = tempfile.mkdtemp(dir=work)
+            os.makedirs(os.path.join(path, 'roads'))
+            return path
+
+        results['json_decode'] = measure(lambda: json.loads(raw), repeat)
+        results['stream_decode'] = measure(
+            lambda: sum(1 for _ in gen.OverpassStreamReader(response_path)), repeat)
+        results['calc_length'] = measure(lambda: [gen.calc_length(c) for c in coords], repeat)
+        if gen.np is not None:
+            results['calc_lengths_packed'] = measure(
+                lambda: gen.calc_lengths_packed(*gen.pack_way_geometries(elements)), repeat)
+        results['iter_roads'] = measure(lambda: list(gen.iter_roads(elements)), repeat)
+        pairs = list(gen.iter_roads(elements))
+        results['merge_road_segments'] = measure(lambda: list(gen.merge_road_segments(pairs)), repeat)
+        results['process_road_data'] = measure(lambda: gen.process_road_data(response, 'fairfax'), repeat)
+        results['save_road_data'] = measure(
+            lambda d: gen.save_road_data(data, 'fairfax', d), repeat, setup=fresh_dir)
+        results['write_road_data_stream'] = measure(
+            lambda d: gen.write_road_data_stream(gen.iter_roads(elements), 'fairfax', d),
+            repeat, setup=fresh_dir)
+        results['write_road_binary'] = measure(
+            lambda d: gen.write_road_binary(data, 'fairfax', d), repeat, setup=fresh_dir)
+
+        def lod(d):
+            builder = gen.LodBuilder()
+            for road in data['roads']:
+                builder.add(road)
+            builder.write('fairfax', d, data)
+        results['lod'] = measure(lod, repeat, setup=fresh_dir)
+
+        def tiles(d):
+            builder = gen.TileBuilder()
+            for road in data['roads']:
+                builder.add(road)
+            builder.write('fairfax', d)
+        results['tiles'] = measure(tiles, repeat, setup=fresh_dir)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    for result in results.values():
+        result.update({'ways': ways, 'vertices': vertices})
+    return results
+
+
+# End-to-end scenarios: jurisdictions, stand-in server settings, CONFIG overrides
+E2E_SCENARIOS = {
+    'cities': {
+        'jurisdictions': ['norton', 'covington', 'emporia', 'lexington', 'galax', 'buena_vista'],
+        'server': {'latency': 0.2},
+    },
+    'counties': {
+        'jurisdictions': ['wise', 'bath', 'henrico', 'richmond_city', 'accomack'],
+        'server': {'latency': 0.5},
+    },
+    'fairfax': {
+        'jurisdictions': ['fairfax', 'falls_church', 'fairfax_city'],
+        'server': {'latency': 1.0, 'ways_per_sq_degree': 150000},
+    },
+    'flaky': {
+        'jurisdictions': ['wise', 'norton', 'bath', 'covington', 'henrico'],
+        'server': {'latency': 0.2, 'failure_rate': 0.25, 'timeout_sleep': 3.0},
+        'config': {'timeout': 5, 'max_retries': 3, 'circuit_breaker_base_delay': 1,
+                   'circuit_breaker_max_delay': 2},
+    },
+}
+
+
+def e2e_benchmark(name: str, servers: int = 2, extra_args: List[str] = None) -> Dict:
+    """
+    Run generate_all_data end to end against stand-in servers.
+
+    The generator runs in a fresh Python process (see run_e2e_child), so
+    its peak RSS is that of this scenario alone, not of the fixtures and
+    scenarios benchmarked before it. Returns wall time, success counts, the
+    stand-in request/failure counts and the generator's own per-stage
+    metric totals.
+    """
+    scenario = E2E_SCENARIOS[name]
+    stand_ins = [StandInOverpass(seed=i, **scenario['server']).start() for i in range(servers)]
+    spec = {'scenario': name, 'servers': [s.url for s in stand_ins], 'args': extra_args or []}
+
+    try:
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--e2e-child', json.dumps(spec)],
+                               capture_output=True, text=True)
+        if child.returncode != 0:
+            raise RuntimeError(f"End-to-end run '{name}' failed:\n{child.stderr[-2000:]}")
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        for s in stand_ins:
+            s.stop()
+
+    result.update({
+        'requests': sum(s.requests for s in stand_ins),
+        'injectedFailures': sum(s.failed for s in stand_ins),
+        'bytesServed': sum(s.bytes_sent for s in stand_ins),
+        'args': extra_args or []
+    })
+    return result
+
+
+def run_e2e_child(spec: Dict) -> Dict:
+    """Generator side of e2e_benchmark, run in its own process against the given servers."""
+    scenario = E2E_SCENARIOS[spec['scenario']]
+    output_dir = tempfile.mkdtemp(prefix='road_bench_out_')
+
+    try:
+        gen.CONFIG.update({
+            'overpass_servers': spec['servers'],
+            'min_request_interval': 0,
+            'delay_between_jurisdictions': 0,
+            'retry_delay': 0,
+            'cache_enabled': False,
+            'metrics_dir': os.path.join(output_dir, '.metrics'),
+        })
+        gen.CONFIG.update(scenario.get('config', {}))
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = gen.main(['--output-dir', output_dir] + scenario['jurisdictions'] + spec['args'])
+        seconds = time.perf_counter() - started
+
+        totals = gen._metrics.totals()
+        return {
+            'seconds': round(seconds, 3),
+            'jurisdictions': len(scenario['jurisdictions']),
+            'success': result['success'],
+            'failed': result['failed'],
+            'stages': {k: round(v, 3) for k, v in sorted(totals['stages'].items())},
+            'counters': totals['counters'],
+            'peakRssBytes': totals['peakRssBytes']
+        }
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+# ============================================================
+# RESULTS
+# ============================================================
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit (with ``-dirty`` for local changes)."""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def environment() -> Dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': getattr(gen.np, '__version__', None),
+    }
+
+
+def compare_results(old: Dict, new: Dict, threshold: float = 0.1):
+    """Print the change of every benchmark present in both result files."""
+    print(f"Comparing {old.get('commit')} -> {new.get('commit')} "
+          f"(changes beyond {threshold:.0%} marked)")
+    for size, stages in new.get('stages', {}).items():
+        for name, result in stages.items():
+            before = old.get('stages', {}).get(size, {}).get(name)
+            if before:
+                _print_change(f"{size}/{name}", before['median'], result['median'], threshold)
+    for name, result in new.get('e2e', {}).items():
+        before = old.get('e2e', {}).get(name)
+        if before:
+            _print_change(f"e2e/{name}", before['seconds'], result['seconds'], threshold)
+
+
+def _print_change(name: str, before: float, after: float, threshold: float):
+    change = (after - before) / before if before else 0.0
+    mark = ''
+    if change > threshold:
+        mark = '  SLOWER'
+    elif change < -threshold:
+        mark = '  faster'
+    print(f"  {name:40s} {before:10.4f}s -> {after:10.4f}s  {change:+7.1%}{mark}")
+
+
+def main(argv: List[str] = None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Benchmark the road data generator offline.')
+    parser.add_argument('--sizes', nargs='+', choices=list(FIXTURE_SIZES), default=list(FIXTURE_SIZES),
+                        help='Fixture sizes for the stage benchmarks (default: all)')
+    parser.add_argument('--scenarios', nargs='+', choices=list(E2E_SCENARIOS), default=list(E2E_SCENARIOS),
+                        help='End-to-end scenarios to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed calls per stage benchmark (default: 5)')
+    parser.add_argument('--stages-only', action='store_true', help='Skip the end-to-end runs')
+    parser.add_argument('--e2e-only', action='store_true', help='Skip the stage benchmarks')
+    parser.add_argument('--e2e-args', default='',
+                        help='Extra generator arguments for end-to-end runs, e.g. "--stream --procs 2"')
+    parser.add_argument('--output', help='Result file (default: .benchmarks/<commit>.json)')
+    parser.add_argument('--compare', metavar='PATH', help='Earlier result file to compare against')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='Only run a stand-in Overpass server on this port')
+    parser.add_argument('--latency', type=float, default=0.0, help='Stand-in latency in seconds (--serve)')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Share of stand-in queries that fail (--serve)')
+    parser.add_argument('--e2e-child', metavar='SPEC', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.e2e_child:
+        print(json.dumps(run_e2e_child(json.loads(args.e2e_child))))
+        return None
+
+    if args.serve is not None:
+        server = StandInOverpass(latency=args.latency, failure_rate=args.failure_rate, port=args.serve)
+        print(f"Stand-in Overpass server on {server.url} (Ctrl+C to stop)")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+        return None
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'environment': environment(),
+        'stages': {},
+        'e2e': {}
+    }
+
+    if not args.e2e_only:
+        for size in args.sizes:
+            print(f"Stage benchmarks: {size} ({FIXTURE_SIZES[size]} ways)...")
+            results['stages'][size] = stage_benchmarks(size, args.repeat)
+            for name, result in results['stages'][size].items():
+                print(f"  {name:28s} {result['median']:9.4f}s  "
+                      f"peak {result.get('peakBytes', 0) / 1024 ** 2:8.1f} MB")
+
+    if not args.stages_only:
+        for name in args.scenarios:
+            print(f"End-to-end: {name}...")
+            result = e2e_benchmark(name, extra_args=args.e2e_args.split())
+            results['e2e'][name] = result
+            print(f"  {result['seconds']:.2f}s, {result['success']}/{result['jurisdictions']} ok, "
+                  f"{result['requests']} requests ({result['injectedFailures']} failures injected)")
+
+    output = args.output or os.path.join('.benchmarks', f"{results['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(json.load(f), results)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -10,16 +10,51 @@ Usage in Google Colab:
     3. Download the generated data/roads/*.json files and data/manifest.json
     4. Upload to your GitHub repo
 
+Usage from the command line:
+    python scripts/generate_road_data_colab.py                     # All jurisdictions
+    python scripts/generate_road_data_colab.py henrico fairfax     # Specific jurisdictions
+    python scripts/generate_road_data_colab.py --jobs 1            # One at a time
+    python scripts/generate_road_data_colab.py --extract virginia-latest.osm.pbf   # No Overpass
+
 Author: Generated from scripts/generate-road-data.js
 """
 
+import argparse
+import bz2
+import cProfile
+import functools
+import gzip
+import hashlib
 import json
 import os
+import queue
 import time
 import math
+import random
+import re
+import shutil
+import struct
+import sys
+import threading
+import tempfile
+import tracemalloc
 import requests
+from array import array
+from bisect import bisect_left
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable
+from xml.etree import ElementTree
+
+try:
+    import numpy as np
+except ImportError:  # geometry falls back to pure Python
+    np = None
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS in the metrics
+    resource = None
 from pathlib import Path
 
 # Configuration
@@ -33,7 +68,66 @@ CONFIG = {
     'timeout': 300,  # 5 minutes (increased for large areas)
     'retry_delay': 5,  # 5 seconds between retries
     'max_retries': 3,
-    'delay_between_jurisdictions': 10  # 10 seconds to avoid rate limiting
+    'delay_between_jurisdictions': 10,  # 10 seconds to avoid rate limiting
+    'max_workers': None,  # jurisdictions in flight (None = servers x per-server limit, 1 = sequential)
+    'per_server_concurrency': 2,  # Overpass grants ~2 query slots per client
+    'min_request_interval': 10,  # seconds between request starts on the same server
+    # Server health tracking
+    'expected_latency': 60,  # assumed seconds per query before a server has been measured
+    'health_ewma_alpha': 0.3,  # weight of the newest sample in latency/success averages
+    'circuit_breaker_threshold': 3,  # consecutive failures before a server is skipped
+    'circuit_breaker_base_delay': 30,  # first skip period in seconds, doubled per trip
+    'circuit_breaker_max_delay': 900,
+    'status_check': True,  # ask /api/status for free slots before querying
+    'status_timeout': 10,
+    'status_cache_seconds': 5,
+    'max_slot_wait': 60,  # longest wait for a query slot before trying another server
+    'adaptive_tiling': True,  # split bboxes that exceed Overpass limits into quadrants
+    'max_tile_depth': 3,  # at most 4^3 = 64 tiles per jurisdiction
+    'pbf_node_index': 'flex_mem',  # pyosmium location store; 'dense_file_array,<path>' keeps it on disk
+    'streaming': False,  # download responses to disk and parse/write them road by road
+    'stream_chunk_size': 1 << 20,  # bytes per read when streaming
+    'stream_dir': None,  # where streamed responses are kept (None = system temp dir)
+    'use_numpy': True,  # vectorized geometry when NumPy is installed
+    'geometry_batch_size': 5000,  # ways per vectorized length batch
+    'merge_segments': True,  # join ways that continue each other with identical attributes (merged roads list wayIds)
+    'write_binary': True,  # also write roads/<id>.bin (quantized typed-array layout)
+    'binary_coord_scale': 1_000_000,  # fixed-point units per degree (~0.1 m)
+    'lod_levels': [10, 12, 14],  # zooms that get a simplified file; full detail above the last
+    'lod_pixel_tolerance': 1.0,  # simplification tolerance in screen pixels at each level's zoom
+    'write_tiles': True,  # merge roads into shared tiles/<z>/<x>/<y>.json with a per-jurisdiction index
+    'tile_zoom': 12,  # ~10 km tiles in Virginia
+    'write_indexes': True,  # search_index.json and fc_mileage.json after a run, referenced from manifest.json
+    'search_min_token_length': 2,  # shorter name/ref tokens are not indexed (numbers always are)
+    # Overpass response cache
+    'cache_enabled': True,
+    'cache_dir': '.overpass_cache',
+    'cache_mode': 'normal',  # 'normal', 'refresh' (ignore cached reads) or 'offline' (cache only)
+    'cache_ttl_days': None,  # None = manifest.json config.staticMaxAgeDays
+    'cache_max_bytes': 4 * 1024 ** 3,  # least recently used entries are evicted past this
+    'cache_compress_level': 6,
+    # Manifest checkpoints and crash recovery
+    'manifest_flush_every': 10,  # jurisdictions between manifest.json rewrites (always flushed at the end)
+    'journal_file': '.run_journal.jsonl',  # per-run journal in the output dir; removed when a run completes
+    'resume': True,  # skip jurisdictions an interrupted run already finished
+    # Overlapping jurisdictions (independent cities inside counties)
+    'shared_fetch': True,  # fetch each group of overlapping bboxes once and split the ways
+    'shared_fetch_min_overlap': 0.9,  # share of a bbox that must lie inside a larger one to join its group
+    # Query batching for small jurisdictions
+    'batch_queries': True,  # pack small nearby jurisdictions into one combined query
+    'batch_max_ways': 10000,  # estimated ways per combined query
+    'batch_max_jurisdictions': 8,
+    'batch_max_distance': 1.0,  # degrees between bbox centres
+    'batch_ways_per_sq_degree': 50000,  # way density guess before a jurisdiction's wayCount is known
+    # Pipelined generation (parallel runs only)
+    'process_workers': None,  # processes building/writing roads while fetching continues (None = CPUs - 1, 0 = in fetch threads)
+    'max_process_workers': 4,  # cap for process_workers=None
+    'pipeline_queue_size': 2,  # fetched batches waiting for a process before fetch threads pause
+    # Run metrics
+    'metrics_enabled': True,
+    'metrics_dir': '.metrics',  # road_data.jsonl (one line per jurisdiction per run) and road_data.prom
+    'profile': False,  # cProfile + tracemalloc per jurisdiction, kept for the slowest ones
+    'profile_top': 5
 }
 
 # OSM to VDOT Functional Class mapping
@@ -209,282 +303,3818 @@ def calc_length(coords: List[List[float]]) -> float:
     return total
 
 
-def fetch_with_retry(url: str, data: str, retries: int = None) -> Optional[Dict]:
-    """Fetch with retry and timeout."""
-    if retries is None:
-        retries = CONFIG['max_retries']
+def pack_way_geometries(ways: List[Dict]):
+    """
+    Pack the geometry of OSM way elements into flat NumPy arrays.
 
-    for attempt in range(1, retries + 1):
-        try:
-            response = requests.post(
-                url,
-                data={'data': data},
-                timeout=CONFIG['timeout'],
-                headers={'Content-Type': 'application/x-www-form-urlencoded'}
-            )
+    Returns (lat, lon, offsets) where the points of way ``k`` are
+    ``lat[offsets[k]:offsets[k + 1]]``.
+    """
+    counts = np.fromiter((len(el['geometry']) for el in ways), dtype=np.int64, count=len(ways))
+    offsets = np.zeros(len(ways) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
 
-            if response.status_code != 200:
-                raise Exception(f"HTTP {response.status_code}")
+    total = int(offsets[-1])
+    lat = np.fromiter((p['lat'] for el in ways for p in el['geometry']), dtype=np.float64, count=total)
+    lon = np.fromiter((p['lon'] for el in ways for p in el['geometry']), dtype=np.float64, count=total)
+    return lat, lon, offsets
 
-            return response.json()
 
-        except Exception as e:
-            print(f"    Attempt {attempt}/{retries} failed: {e}")
-            if attempt < retries:
-                print(f"    Waiting {CONFIG['retry_delay']}s before retry...")
-                time.sleep(CONFIG['retry_delay'])
+def calc_lengths_packed(lat, lon, offsets):
+    """
+    Haversine length in miles of every way in a packed batch.
+
+    All segment lengths are computed in one vectorized pass (same formula as
+    calc_length) and summed per way.
+    """
+    R = 3959  # Earth's radius in miles
+
+    d_lat = np.radians(lat[1:] - lat[:-1])
+    d_lon = np.radians(lon[1:] - lon[:-1])
+
+    a = (np.sin(d_lat / 2) ** 2 +
+         np.cos(np.radians(lat[:-1])) * np.cos(np.radians(lat[1:])) *
+         np.sin(d_lon / 2) ** 2)
+
+    # One slot per point: segment i runs from point i to i + 1, and the slot
+    # of each way's last point (which would bridge into the next way) is zero
+    segments = np.zeros(len(lat))
+    segments[:-1] = R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    segments[offsets[1:-1] - 1] = 0.0
+
+    return np.add.reduceat(segments, offsets[:-1])
+
+
+def server_name(url: str) -> str:
+    """Short display name for an Overpass server URL."""
+    return url.split('//')[1].split('.')[0]
+
+
+def status_url(url: str) -> str:
+    """Overpass ``/api/status`` URL for an ``/api/interpreter`` URL."""
+    return url.rsplit('/interpreter', 1)[0] + '/status'
+
+
+def parse_overpass_status(text: str) -> Optional[float]:
+    """
+    Parse an Overpass ``/api/status`` page.
+
+    Returns the number of seconds until a query slot is free (0 if one is free
+    now) or None if the page does not look like an Overpass status report.
+    """
+    rate_limit = re.search(r'Rate limit:\s*(\d+)', text)
+    if rate_limit and int(rate_limit.group(1)) == 0:
+        return 0.0
+
+    available = re.search(r'(\d+) slots? available now', text)
+    if available and int(available.group(1)) > 0:
+        return 0.0
+
+    waits = [int(w) for w in re.findall(r'Slot available after: \S+, in (-?\d+) seconds', text)]
+    if waits:
+        return float(max(0, min(waits)))
+
+    if available:
+        # "0 slots available now" with no slot listing; assume a short wait
+        return float(CONFIG['retry_delay'])
 
     return None
 
 
-def fetch_road_data(jurisdiction_id: str) -> Optional[Dict]:
-    """Fetch road data from Overpass API."""
-    j = JURISDICTIONS.get(jurisdiction_id)
-    if not j:
-        print(f"Unknown jurisdiction: {jurisdiction_id}")
-        return None
+class OverpassHTTPError(Exception):
+    """Non-200 response from an Overpass server."""
 
-    west, south, east, north = j['bbox']
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
 
-    hw_types = [
-        'motorway', 'motorway_link', 'trunk', 'trunk_link',
-        'primary', 'primary_link', 'secondary', 'secondary_link',
-        'tertiary', 'tertiary_link', 'unclassified'
-    ]
 
-    way_queries = '\n'.join([
-        f'way["highway"="{t}"]({south},{west},{north},{east});'
-        for t in hw_types
-    ])
+class OverpassTimeout(Exception):
+    """Request to an Overpass server timed out on the client side."""
 
-    query = f'[out:json][timeout:300][maxsize:536870912];({way_queries});out body geom;'
 
-    # Try each server
-    for server in CONFIG['overpass_servers']:
-        server_name = server.split('//')[1].split('.')[0]
-        print(f"    Trying {server_name}...")
+class OverpassQueryTooLarge(Exception):
+    """Query exceeded the Overpass ``[timeout]``/``[maxsize]`` limits."""
 
-        data = fetch_with_retry(server, query)
 
-        if data and 'elements' in data:
-            return data
+class OverpassTimedOutEverywhere(OverpassQueryTooLarge):
+    """Query timed out on every server tried: probably too large, but maybe just an outage."""
+
+    MESSAGE = 'timed out on every server'
+
+    def __init__(self):
+        super().__init__(self.MESSAGE)
 
+
+def overpass_limit_error(data: Dict) -> Optional[str]:
+    """Return the ``remark`` of a response cut short by Overpass limits, else None."""
+    remark = data.get('remark') or ''
+    if 'runtime error' in remark and ('timed out' in remark or 'out of memory' in remark):
+        return remark
     return None
 
 
-def process_road_data(osm_data: Dict, jurisdiction_id: str) -> Dict:
-    """Process raw OSM data into our format."""
-    j = JURISDICTIONS[jurisdiction_id]
-    roads = []
-    total_miles = 0.0
+class ServerHealthTracker:
+    """
+    Tracks latency, failures and throttling for each Overpass server.
 
-    fc_counts = {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0, '6': 0, '7': 0}
+    A server that fails ``circuit_breaker_threshold`` times in a row (or answers
+    HTTP 429) has its circuit opened for an exponentially growing, jittered
+    period and is skipped until it expires. After that it gets a single probe
+    request (half-open); success closes the circuit again.
+    """
 
-    for el in osm_data.get('elements', []):
-        if el.get('type') != 'way' or not el.get('geometry'):
-            continue
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
 
-        tags = el.get('tags', {})
-        highway = tags.get('highway', '')
-        func_class = OSM_TO_VDOT.get(highway, '7')
-        coords = [[p['lat'], p['lon']] for p in el['geometry']]
-        length = calc_length(coords)
-
-        road = {
-            'id': el['id'],
-            'name': tags.get('name') or tags.get('ref') or f"Unnamed {highway}",
-            'highway': highway,
-            'funcClass': func_class,
-            'ref': tags.get('ref', ''),
-            'lanes': tags.get('lanes', ''),
-            'maxspeed': tags.get('maxspeed', ''),
-            'surface': tags.get('surface', ''),
-            'length': round(length, 3),
-            'coords': coords
-        }
+    def _get(self, server: str) -> Dict:
+        if server not in self._stats:
+            self._stats[server] = {
+                'requests': 0,
+                'failures': 0,
+                'throttled': 0,     # HTTP 429
+                'overloaded': 0,    # HTTP 504 / client-side timeouts
+                'latency': None,    # EWMA of successful request time (s)
+                'success_rate': 1.0,
+                'consecutive_failures': 0,
+                'trips': 0,
+                'open_until': 0.0,
+                'slot_at': 0.0,
+                'status_checked': None
+            }
+        return self._stats[server]
 
-        roads.append(road)
-        total_miles += length
-        fc_counts[func_class] += 1
+    def record_success(self, server: str, latency: float):
+        """Record a successful request that took ``latency`` seconds."""
+        alpha = CONFIG['health_ewma_alpha']
+        with self._lock:
+            st = self._get(server)
+            st['requests'] += 1
+            st['latency'] = latency if st['latency'] is None else \
+                (1 - alpha) * st['latency'] + alpha * latency
+            st['success_rate'] = (1 - alpha) * st['success_rate'] + alpha
+            st['consecutive_failures'] = 0
+            st['trips'] = 0
+            st['open_until'] = 0.0
 
-    return {
-        'jurisdiction': jurisdiction_id,
-        'jurisdictionName': j['name'],
-        'generated': datetime.utcnow().isoformat() + 'Z',
-        'version': '1.0',
-        'roadCount': len(roads),
-        'totalMiles': round(total_miles, 2),
-        'fcBreakdown': fc_counts,
-        'roads': roads
-    }
+    def record_failure(self, server: str, status_code: int = None, timed_out: bool = False):
+        """Record a failed request and trip the circuit breaker if needed."""
+        alpha = CONFIG['health_ewma_alpha']
+        with self._lock:
+            st = self._get(server)
+            st['requests'] += 1
+            st['failures'] += 1
+            st['success_rate'] = (1 - alpha) * st['success_rate']
+            st['consecutive_failures'] += 1
+            if status_code == 429:
+                st['throttled'] += 1
+            if status_code == 504 or timed_out:
+                st['overloaded'] += 1
 
+            if status_code == 429 or \
+                    st['consecutive_failures'] >= CONFIG['circuit_breaker_threshold']:
+                st['trips'] += 1
+                backoff = min(CONFIG['circuit_breaker_base_delay'] * 2 ** (st['trips'] - 1),
+                              CONFIG['circuit_breaker_max_delay'])
+                # Equal jitter keeps mirrors from being retried in lockstep
+                delay = backoff / 2 + random.uniform(0, backoff / 2)
+                st['open_until'] = time.monotonic() + delay
+                st['consecutive_failures'] = 0
+                print(f"    Circuit open for {server_name(server)} ({delay:.0f}s)")
 
-def save_road_data(data: Dict, jurisdiction_id: str, output_dir: str) -> str:
-    """Save road data to file."""
-    roads_dir = os.path.join(output_dir, 'roads')
-    os.makedirs(roads_dir, exist_ok=True)
+    def is_open(self, server: str) -> bool:
+        """True while the server's circuit breaker is open."""
+        with self._lock:
+            return self._get(server)['open_until'] > time.monotonic()
 
-    file_path = os.path.join(roads_dir, f'{jurisdiction_id}.json')
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    def is_half_open(self, server: str) -> bool:
+        """True once an opened circuit has expired but no request has succeeded yet."""
+        with self._lock:
+            st = self._get(server)
+            return st['trips'] > 0 and st['open_until'] <= time.monotonic()
 
-    print(f"    Saved to {file_path}")
-    return file_path
+    def available_at(self, server: str) -> float:
+        """``time.monotonic()`` value from which the server may be used."""
+        with self._lock:
+            st = self._get(server)
+            return max(st['open_until'], st['slot_at'])
 
+    def expected_completion(self, server: str) -> float:
+        """Expected seconds for a query on this server, including failed attempts."""
+        with self._lock:
+            st = self._get(server)
+            latency = st['latency'] if st['latency'] is not None else CONFIG['expected_latency']
+            return latency / max(st['success_rate'], 0.05)
 
-def update_manifest(jurisdiction_id: str, data: Dict, output_dir: str):
-    """Update manifest file."""
-    manifest_path = os.path.join(output_dir, 'manifest.json')
+    def check_status(self, server: str) -> Optional[float]:
+        """
+        Ask the server's ``/api/status`` how long until a query slot is free.
 
-    # Load existing manifest or create new one
-    if os.path.exists(manifest_path):
-        with open(manifest_path, 'r') as f:
-            manifest = json.load(f)
-    else:
-        manifest = {
-            'generated': '',
-            'version': '1.0',
-            'jurisdictions': {}
+        Results are cached for ``status_cache_seconds``. Returns None when the
+        status page is unavailable (some mirrors do not expose it).
+        """
+        if not CONFIG['status_check']:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            st = self._get(server)
+            checked = st['status_checked']
+            if checked is not None and now - checked < CONFIG['status_cache_seconds']:
+                return max(0.0, st['slot_at'] - now)
+
+        try:
+            response = requests.get(status_url(server), timeout=CONFIG['status_timeout'])
+            wait = parse_overpass_status(response.text) if response.status_code == 200 else None
+        except Exception:
+            wait = None
+
+        with self._lock:
+            st = self._get(server)
+            st['status_checked'] = time.monotonic()
+            st['slot_at'] = st['status_checked'] + (wait or 0.0)
+        return wait
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Copy of the per-server statistics."""
+        with self._lock:
+            return {
+                server: {
+                    'requests': st['requests'],
+                    'failures': st['failures'],
+                    'throttled': st['throttled'],
+                    'overloaded': st['overloaded'],
+                    'latency': round(st['latency'], 2) if st['latency'] is not None else None,
+                    'successRate': round(st['success_rate'], 3),
+                    'circuitOpen': st['open_until'] > time.monotonic()
+                }
+                for server, st in self._stats.items()
+            }
+
+
+# ============================================================
+# RUN METRICS
+# ============================================================
+def peak_rss_bytes() -> int:
+    """High-water mark of this process's resident set size over its lifetime (0 where unsupported)."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process right now, from /proc/self/statm (0 where unsupported)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+class RunMetrics:
+    """
+    Per-jurisdiction timings and counters for one run.
+
+    Work is charged to the label of the innermost scope() on the current
+    thread: a jurisdiction id, or a batch label like ``a+b`` while one
+    fetch serves several jurisdictions. stage() times are exclusive (time
+    in a nested stage is not counted again in the enclosing one), so the
+    stages of a label add up to the time spent working on it.
+
+    A label's ``rssBytes`` is the highest current RSS sampled as its stages
+    finish, so it reflects the memory in use while that label was worked
+    on (including other labels running at the same time in the same
+    process). The process-wide high-water mark is only reported in
+    totals(), since ru_maxrss never goes down and would repeat the biggest
+    jurisdiction's peak for every later one.
+    """
+
+    COUNTERS = ('requests', 'retries', 'cacheHits', 'bytesReceived', 'bytesWritten',
+                'elements', 'vertices', 'roads')
+
+    def __init__(self):
+        self.started = time.time()
+        self.units = {}
+        self.batch_of = {}
+        self.process_peak = 0  # highest peak_rss_bytes() of pipeline worker processes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _unit(self, label: str) -> Dict:
+        if label not in self.units:
+            self.units[label] = {'stages': {}, 'counters': {}, 'servers': [],
+                                 'rssBytes': 0, 'profiles': []}
+        return self.units[label]
+
+    def current(self) -> Optional[str]:
+        scopes = getattr(self._local, 'scopes', None)
+        return scopes[-1] if scopes else None
+
+    @contextmanager
+    def scope(self, label: str, jurisdictions: Iterable[str] = ()):
+        """Charge work on this thread to ``label``; ``jurisdictions`` share it as their batch."""
+        with self._lock:
+            self._unit(label)
+            for j_id in jurisdictions:
+                if j_id != label:
+                    self.batch_of[j_id] = label
+
+        if not hasattr(self._local, 'scopes'):
+            self._local.scopes = []
+        self._local.scopes.append(label)
+        try:
+            yield
+        finally:
+            self._local.scopes.pop()
+            self._sample_rss(label)
+
+    def _sample_rss(self, label: Optional[str]):
+        if label is None:
+            return
+        rss = current_rss_bytes()
+        with self._lock:
+            unit = self._unit(label)
+            unit['rssBytes'] = max(unit['rssBytes'], rss)
+
+    def bind(self, fn):
+        """Wrap ``fn`` to run in the current scope (for work handed to other threads)."""
+        label = self.current()
+        if label is None:
+            return fn
+
+        def bound(*args, **kwargs):
+            with self.scope(label):
+                return fn(*args, **kwargs)
+        return bound
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block as stage ``name`` of the current scope."""
+        if not hasattr(self._local, 'stages'):
+            self._local.stages = []
+        nested = [0.0]
+        self._local.stages.append(nested)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._local.stages.pop()
+            if self._local.stages:
+                self._local.stages[-1][0] += elapsed
+            self._add('stages', name, elapsed - nested[0])
+            self._sample_rss(self.current())
+
+    def add_stage(self, name: str, seconds: float):
+        """Charge ``seconds`` measured inside the enclosing stage to stage ``name`` instead."""
+        stages = getattr(self._local, 'stages', None)
+        if stages:
+            stages[-1][0] += seconds
+        self._add('stages', name, seconds)
+
+    def timed_iter(self, iterable: Iterable, name: str):
+        """Yield from ``iterable``, charging the time spent producing items to stage ``name``."""
+        seconds = 0.0
+        it = iter(iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - started
+                yield item
+        finally:
+            self.add_stage(name, seconds)
+
+    def count(self, name: str, value: int = 1):
+        self._add('counters', name, value)
+
+    def _add(self, kind: str, name: str, value):
+        label = self.current()
+        if label is None:
+            return
+        with self._lock:
+            values = self._unit(label)[kind]
+            values[name] = values.get(name, 0) + value
+
+    def server(self, url: str):
+        """Note that the current scope sent a request to ``url``."""
+        label = self.current()
+        if label is None:
+            return
+        with self._lock:
+            servers = self._unit(label)['servers']
+            if server_name(url) not in servers:
+                servers.append(server_name(url))
+
+    def add_profile(self, stage: str, seconds: float, path: str):
+        label = self.current()
+        with self._lock:
+            self._unit(label)['profiles'].append({'stage': stage, 'seconds': seconds, 'path': path})
+
+    def drain(self) -> Dict:
+        """Hand over everything recorded so far (from a pipeline worker process)."""
+        with self._lock:
+            data = {'units': self.units, 'batchOf': self.batch_of, 'peakRssBytes': peak_rss_bytes()}
+            self.units, self.batch_of = {}, {}
+        return data
+
+    def merge(self, data: Dict):
+        """Add a drain() result from another process."""
+        with self._lock:
+            self.batch_of.update(data['batchOf'])
+            self.process_peak = max(self.process_peak, data['peakRssBytes'])
+            for label, other in data['units'].items():
+                unit = self._unit(label)
+                for kind in ('stages', 'counters'):
+                    for name, value in other[kind].items():
+                        unit[kind][name] = unit[kind].get(name, 0) + value
+                unit['servers'] += [name for name in other['servers'] if name not in unit['servers']]
+                unit['rssBytes'] = max(unit['rssBytes'], other['rssBytes'])
+                unit['profiles'] += other['profiles']
+
+    @staticmethod
+    def _summary(unit: Dict) -> Dict:
+        summary = {
+            'seconds': round(sum(unit['stages'].values()), 3),
+            'stages': {name: round(value, 3) for name, value in sorted(unit['stages'].items())}
         }
+        summary.update({name: unit['counters'].get(name, 0) for name in RunMetrics.COUNTERS})
+        summary['servers'] = unit['servers']
+        summary['rssBytes'] = unit['rssBytes']
+        return summary
 
-    manifest['jurisdictions'][jurisdiction_id] = {
-        'available': True,
-        'lastUpdated': data['generated'],
-        'roadCount': data['roadCount'],
-        'totalMiles': data['totalMiles']
-    }
+    def records(self, results: Dict[str, bool] = None) -> List[Dict]:
+        """
+        One record per jurisdiction.
+
+        Figures of a fetch shared with other jurisdictions are reported
+        once per member under ``batch``; they are not added to its own.
+        """
+        with self._lock:
+            j_ids = sorted({label for label in self.units if label in JURISDICTIONS} | set(self.batch_of))
+            records = []
+            for j_id in j_ids:
+                record = {'jurisdiction': j_id}
+                if results is not None and j_id in results:
+                    record['success'] = results[j_id]
+                record.update(self._summary(self._unit(j_id)))
+                if j_id in self.batch_of:
+                    record['batch'] = dict(self._summary(self._unit(self.batch_of[j_id])),
+                                           label=self.batch_of[j_id])
+                records.append(record)
+            return records
+
+    def totals(self) -> Dict:
+        """
+        Stage seconds and counters summed over every label (nothing double
+        counted), and the highest peak RSS of any process of the run.
+        """
+        with self._lock:
+            stages, counters = {}, {name: 0 for name in RunMetrics.COUNTERS}
+            for unit in self.units.values():
+                for name, value in unit['stages'].items():
+                    stages[name] = stages.get(name, 0) + value
+                for name, value in unit['counters'].items():
+                    counters[name] = counters.get(name, 0) + value
+            peak = max(self.process_peak, peak_rss_bytes())
+            return {'stages': stages, 'counters': counters, 'peakRssBytes': peak}
 
-    manifest['generated'] = datetime.utcnow().isoformat() + 'Z'
 
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
+_metrics = RunMetrics()
 
-    print(f"    Updated manifest.json")
 
+def timed(stage: str):
+    """Decorator charging a function's time to ``stage`` of the current metrics scope."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _metrics.stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
 
-def generate_all_data(output_dir: str = 'data', jurisdictions: List[str] = None):
+
+@contextmanager
+def profiled(stage: str):
     """
-    Main function to generate road data for all Virginia jurisdictions.
+    With ``CONFIG['profile']``, cProfile the block and snapshot tracemalloc after it.
 
-    Args:
-        output_dir: Directory to save output files (default: 'data')
-        jurisdictions: List of specific jurisdiction IDs to process (default: all)
+    Files go to <metrics_dir>/profile/<label>.<stage>.pstats / .tracemalloc;
+    write_metrics() keeps them only for the ``profile_top`` slowest labels.
     """
-    print('=' * 50)
-    print('  CRASH LENS - Road Data Generator (Python/Colab)')
-    print('=' * 50)
-    print()
+    if not CONFIG['profile'] or _metrics.current() is None:
+        yield
+        return
 
-    # Get jurisdictions to process
-    if jurisdictions is None or len(jurisdictions) == 0:
-        jurisdictions_to_process = list(JURISDICTIONS.keys())
-        print(f"Processing ALL {len(jurisdictions_to_process)} jurisdictions...")
-    else:
-        jurisdictions_to_process = jurisdictions
-        print(f"Processing {len(jurisdictions_to_process)} jurisdiction(s)...")
-    print()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        directory = os.path.join(CONFIG['metrics_dir'], 'profile')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{_metrics.current()}.{stage}')
+        profiler.dump_stats(path + '.pstats')
+        if tracemalloc.is_tracing():
+            tracemalloc.take_snapshot().dump(path + '.tracemalloc')
+        _metrics.add_profile(stage, time.perf_counter() - started, path)
 
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
 
-    success_count = 0
-    fail_count = 0
-    failed_jurisdictions = []
+def start_metrics():
+    """Begin a fresh RunMetrics for a run (and memory tracing when profiling)."""
+    global _metrics
+    _metrics = RunMetrics()
+    if CONFIG['profile'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
 
-    for i, j_id in enumerate(jurisdictions_to_process):
-        j = JURISDICTIONS.get(j_id)
 
-        if not j:
-            print(f"[{i + 1}/{len(jurisdictions_to_process)}] SKIP: Unknown jurisdiction '{j_id}'")
-            fail_count += 1
-            failed_jurisdictions.append(j_id)
+def write_metrics(results: Dict[str, bool]) -> Optional[str]:
+    """
+    Write the run's metrics: append one JSON line per jurisdiction to
+    road_data.jsonl and replace the road_data.prom summary (Prometheus
+    textfile collector format). Returns the metrics directory.
+    """
+    if not CONFIG['metrics_enabled']:
+        return None
+
+    directory = CONFIG['metrics_dir']
+    os.makedirs(directory, exist_ok=True)
+    run = datetime.utcfromtimestamp(_metrics.started).isoformat() + 'Z'
+    records = _metrics.records(results)
+
+    with open(os.path.join(directory, 'road_data.jsonl'), 'a') as f:
+        for record in records:
+            f.write(json.dumps(dict(record, run=run)) + '\n')
+
+    totals = _metrics.totals()
+    lines = [
+        '# HELP road_data_run_timestamp_seconds Start of the last road data run.',
+        '# TYPE road_data_run_timestamp_seconds gauge',
+        f'road_data_run_timestamp_seconds {_metrics.started:.0f}',
+        '# HELP road_data_run_duration_seconds Wall time of the last road data run.',
+        '# TYPE road_data_run_duration_seconds gauge',
+        f'road_data_run_duration_seconds {time.time() - _metrics.started:.3f}',
+        '# HELP road_data_jurisdictions Jurisdictions in the last run by outcome.',
+        '# TYPE road_data_jurisdictions gauge',
+        f'road_data_jurisdictions{{status="success"}} {sum(1 for ok in results.values() if ok)}',
+        f'road_data_jurisdictions{{status="failed"}} {sum(1 for ok in results.values() if not ok)}',
+        '# HELP road_data_stage_seconds Time spent per stage in the last run, summed over workers.',
+        '# TYPE road_data_stage_seconds gauge',
+    ]
+    lines += [f'road_data_stage_seconds{{stage="{name}"}} {value:.3f}'
+              for name, value in sorted(totals['stages'].items())]
+    for name, value in totals['counters'].items():
+        metric = 'road_data_' + re.sub(r'([A-Z])', r'_\1', name).lower()
+        lines += [f'# HELP {metric} {name} summed over the last run.', f'# TYPE {metric} gauge',
+                  f'{metric} {value}']
+    lines += [
+        '# HELP road_data_peak_rss_bytes Highest peak RSS of any generator process.',
+        '# TYPE road_data_peak_rss_bytes gauge',
+        f'road_data_peak_rss_bytes {totals["peakRssBytes"]}',
+        '# HELP road_data_jurisdiction_seconds Time spent on each jurisdiction, shared fetches excluded.',
+        '# TYPE road_data_jurisdiction_seconds gauge',
+    ]
+    lines += [f'road_data_jurisdiction_seconds{{jurisdiction="{r["jurisdiction"]}"}} {r["seconds"]}'
+              for r in records]
+
+    prom_path = os.path.join(directory, 'road_data.prom')
+    with open(prom_path + '.tmp', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(prom_path + '.tmp', prom_path)
+
+    # Keep profiles of the slowest labels only
+    with _metrics._lock:
+        profiled_units = [(sum(p['seconds'] for p in unit['profiles']), label, unit['profiles'])
+                          for label, unit in _metrics.units.items() if unit['profiles']]
+    profiled_units.sort(key=lambda u: u[0], reverse=True)
+    for rank, (seconds, label, profiles) in enumerate(profiled_units):
+        if rank < CONFIG['profile_top']:
+            print(f"  Profile: {label} ({seconds:.1f}s) -> {profiles[0]['path']}.*")
             continue
+        for profile in profiles:
+            for suffix in ('.pstats', '.tracemalloc'):
+                if os.path.exists(profile['path'] + suffix):
+                    os.remove(profile['path'] + suffix)
 
-        print(f"[{i + 1}/{len(jurisdictions_to_process)}] {j['name']}")
+    print(f"  Metrics: {os.path.join(directory, 'road_data.jsonl')}, {prom_path}")
+    return directory
 
-        # Fetch data
-        osm_data = fetch_road_data(j_id)
 
-        if not osm_data:
-            print(f"    FAILED: Could not fetch data")
-            print()
-            fail_count += 1
-            failed_jurisdictions.append(j_id)
+def fetch_with_retry(url: str, data: str, retries: int = None,
+                     health: ServerHealthTracker = None, stream_to: str = None) -> Optional[Dict]:
+    """
+    Fetch with retry and timeout.
+
+    With ``stream_to`` the response body is written to that file in chunks
+    instead of being decoded, and ``{'elements_files': [stream_to]}`` is
+    returned (see iter_response_elements).
+
+    HTTP 429/504 responses and timeouts mean the server is overloaded, so they
+    give up on this server immediately instead of retrying it. Timeouts raise
+    OverpassTimeout and responses cut short by the query's own limits raise
+    OverpassQueryTooLarge, since no other server will do better with them.
+    """
+    if retries is None:
+        retries = CONFIG['max_retries']
+
+    for attempt in range(1, retries + 1):
+        started = time.monotonic()
+        _metrics.count('requests')
+        _metrics.count('retries', attempt > 1)
+        _metrics.server(url)
+        try:
+            with _metrics.stage('transfer'):
+                response = requests.post(
+                    url,
+                    data={'data': data},
+                    timeout=CONFIG['timeout'],
+                    headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                    stream=stream_to is not None
+                )
+
+                if response.status_code != 200:
+                    raise OverpassHTTPError(response.status_code)
+
+                if stream_to is not None:
+                    with open(stream_to, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=CONFIG['stream_chunk_size']):
+                            f.write(chunk)
+                            _metrics.count('bytesReceived', len(chunk))
+                else:
+                    _metrics.count('bytesReceived', len(response.content))
+
+            if stream_to is not None:
+                result = {'elements_files': [stream_to], 'remark': read_tail_remark(stream_to)}
+            else:
+                with _metrics.stage('decode'):
+                    result = response.json()
+
+        except Exception as e:
+            status_code = getattr(e, 'status_code', None)
+            timed_out = isinstance(e, requests.Timeout)
+            if health is not None:
+                health.record_failure(url, status_code=status_code, timed_out=timed_out)
+
+            print(f"    Attempt {attempt}/{retries} failed: {e}")
+            if timed_out:
+                raise OverpassTimeout(str(e)) from e
+            if status_code in (429, 504):
+                print(f"    {server_name(url)} is overloaded, trying another server")
+                return None
+            if health is not None and health.is_open(url):
+                return None
+            if attempt < retries:
+                print(f"    Waiting {CONFIG['retry_delay']}s before retry...")
+                time.sleep(CONFIG['retry_delay'])
             continue
 
-        print(f"    Received {len(osm_data.get('elements', []))} elements")
+        if health is not None:
+            health.record_success(url, time.monotonic() - started)
 
-        # Process data
-        processed_data = process_road_data(osm_data, j_id)
-        print(f"    Processed {processed_data['roadCount']} roads ({processed_data['totalMiles']} miles)")
+        limit_error = overpass_limit_error(result)
+        if limit_error:
+            raise OverpassQueryTooLarge(limit_error)
+        return result
 
-        # Save to file
-        save_road_data(processed_data, j_id, output_dir)
+    return None
 
-        # Update manifest
-        update_manifest(j_id, processed_data, output_dir)
 
-        success_count += 1
-        print(f"    SUCCESS")
-        print()
+class ServerScheduler:
+    """
+    Hands out Overpass servers to concurrent fetch workers.
 
-        # Delay between jurisdictions to avoid rate limiting
-        if i < len(jurisdictions_to_process) - 1:
-            print(f"    Waiting {CONFIG['delay_between_jurisdictions']}s before next jurisdiction...")
-            print()
-            time.sleep(CONFIG['delay_between_jurisdictions'])
+    Each server has at most ``per_server_concurrency`` requests in flight and
+    consecutive requests to the same server start at least
+    ``min_request_interval`` seconds apart. Among the servers a worker has not
+    tried yet, it gets the one with the earliest expected completion time
+    according to the health tracker; servers with an open circuit are held
+    back until it expires.
+    """
 
-    print('=' * 50)
-    print(f"  COMPLETE: {success_count} success, {fail_count} failed")
-    if failed_jurisdictions:
-        print(f"  Failed: {', '.join(failed_jurisdictions)}")
-    print('=' * 50)
+    def __init__(self, servers: List[str], per_server_concurrency: int = None,
+                 min_request_interval: float = None, health: ServerHealthTracker = None):
+        if per_server_concurrency is None:
+            per_server_concurrency = CONFIG['per_server_concurrency']
+        if min_request_interval is None:
+            min_request_interval = CONFIG['min_request_interval']
+
+        self.servers = list(servers)
+        self.per_server_concurrency = max(1, per_server_concurrency)
+        self.min_request_interval = min_request_interval
+        self.health = health if health is not None else ServerHealthTracker()
+        self._cond = threading.Condition()
+        self._in_flight = {s: 0 for s in self.servers}
+        self._next_start = {s: 0.0 for s in self.servers}
+
+    @property
+    def capacity(self) -> int:
+        """Total number of requests that may be in flight at once."""
+        return len(self.servers) * self.per_server_concurrency
+
+    def _limit(self, server: str) -> int:
+        # A half-open circuit only gets a single probe request
+        return 1 if self.health.is_half_open(server) else self.per_server_concurrency
+
+    def _eta(self, server: str, now: float) -> float:
+        ready_at = max(self._next_start[server], self.health.available_at(server))
+        queue_factor = 1 + self._in_flight[server] / self.per_server_concurrency
+        return max(0.0, ready_at - now) + self.health.expected_completion(server) * queue_factor
 
+    @timed('queue')
+    def acquire(self, exclude: Iterable[str] = ()) -> Optional[str]:
+        """Block until a server not in ``exclude`` is free; None if none are left."""
+        exclude = set(exclude)
+
+        with self._cond:
+            while True:
+                candidates = [s for s in self.servers if s not in exclude]
+                if not candidates:
+                    return None
+
+                now = time.monotonic()
+                open_slots = [s for s in candidates if self._in_flight[s] < self._limit(s)]
+
+                wait = None
+                if open_slots:
+                    server = min(open_slots, key=lambda s: self._eta(s, now))
+                    ready_at = max(self._next_start[server], self.health.available_at(server))
+                    if ready_at <= now:
+                        self._in_flight[server] += 1
+                        self._next_start[server] = now + self.min_request_interval
+                        return server
+                    wait = ready_at - now
+
+                # Sleep until the best server is ready or a slot is released
+                self._cond.wait(timeout=wait)
+
+    def release(self, server: str):
+        """Return a server slot obtained from :meth:`acquire`."""
+        with self._cond:
+            self._in_flight[server] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, exclude: Iterable[str] = ()):
+        """Context manager around :meth:`acquire`/:meth:`release`."""
+        server = self.acquire(exclude)
+        try:
+            yield server
+        finally:
+            if server is not None:
+                self.release(server)
+
+
+# Highway types requested from Overpass
+HIGHWAY_TYPES = [
+    'motorway', 'motorway_link', 'trunk', 'trunk_link',
+    'primary', 'primary_link', 'secondary', 'secondary_link',
+    'tertiary', 'tertiary_link', 'unclassified'
+]
+
+
+def build_overpass_query(bbox: List[float], *more_bboxes: List[float]) -> str:
+    """Overpass QL query for all HIGHWAY_TYPES ways in one or more [west, south, east, north] bboxes."""
+    way_queries = '\n'.join([
+        f'way["highway"="{t}"]({south},{west},{north},{east});'
+        for west, south, east, north in (bbox, *more_bboxes)
+        for t in HIGHWAY_TYPES
+    ])
+
+    return f'[out:json][timeout:300][maxsize:536870912];({way_queries});out body geom;'
+
+
+def union_bbox(bboxes: Iterable[List[float]]) -> List[float]:
+    """Smallest [west, south, east, north] bbox containing all the given ones."""
+    bboxes = list(bboxes)
+    return [min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+            max(b[2] for b in bboxes), max(b[3] for b in bboxes)]
+
+
+def split_bbox(bbox: List[float]) -> Dict[str, List[float]]:
+    """Split a [west, south, east, north] bbox into four named quadrants."""
+    west, south, east, north = bbox
+    mid_lon = round((west + east) / 2, 6)
+    mid_lat = round((south + north) / 2, 6)
     return {
-        'success': success_count,
-        'failed': fail_count,
-        'failed_jurisdictions': failed_jurisdictions
+        'sw': [west, south, mid_lon, mid_lat],
+        'se': [mid_lon, south, east, mid_lat],
+        'nw': [west, mid_lat, mid_lon, north],
+        'ne': [mid_lon, mid_lat, east, north]
     }
 
 
-# ============================================================
-# GOOGLE COLAB SPECIFIC FUNCTIONS
-# ============================================================
+_OSM_BASE = re.compile(r'"timestamp_osm_base"\s*:\s*"([^"]+)"')
 
-def download_as_zip(output_dir: str = 'data'):
-    """Create a zip file and trigger download in Colab."""
-    import shutil
-    from google.colab import files
 
-    zip_name = 'virginia_road_data'
-    shutil.make_archive(zip_name, 'zip', output_dir)
-    files.download(f'{zip_name}.zip')
-    print(f"Downloaded {zip_name}.zip")
+def response_osm_base(osm_data: Dict) -> Optional[str]:
+    """
+    The ``timestamp_osm_base`` a response reflects (oldest one for merged tiles).
 
+    This is the point in OSM history the data is current to, and the
+    ``newer:`` cut-off for the next incremental probe.
+    """
+    if 'osmBase' in osm_data:
+        return osm_data['osmBase']
+    if 'osm3s' in osm_data:
+        return osm_data['osm3s'].get('timestamp_osm_base')
 
-def list_jurisdictions():
-    """Print all available jurisdiction IDs."""
-    print("Counties (95):")
-    counties = [k for k, v in JURISDICTIONS.items() if v['type'] == 'county']
-    for i, c in enumerate(sorted(counties)):
-        print(f"  {c}", end='\t\t' if len(c) < 12 else '\t')
-        if (i + 1) % 4 == 0:
-            print()
-    print()
+    bases = []
+    for path in osm_data.get('elements_files', []):
+        with open(path, 'rb') as f:
+            match = _OSM_BASE.search(f.read(4096).decode('utf-8', errors='replace'))
+        if not match:
+            return None
+        bases.append(match.group(1))
+    return min(bases) if bases else None
 
-    print("\nIndependent Cities (38):")
-    cities = [k for k, v in JURISDICTIONS.items() if v['type'] == 'city']
-    for i, c in enumerate(sorted(cities)):
-        print(f"  {c}", end='\t\t' if len(c) < 12 else '\t')
-        if (i + 1) % 4 == 0:
-            print()
-    print()
 
+def merge_overpass_results(results: List[Dict]) -> Dict:
+    """Merge Overpass responses, keeping one copy of each element by type and id."""
+    bases = [response_osm_base(data) for data in results]
+    osm_base = min(bases) if bases and None not in bases else None
 
-# ============================================================
-# MAIN EXECUTION
-# ============================================================
+    if all('elements_files' in data for data in results):
+        # Streamed responses are deduplicated when they are read back
+        merged = {'elements_files': [path for data in results for path in data['elements_files']]}
+    else:
+        seen = set()
+        elements = []
+        for data in results:
+            for el in data.get('elements', []):
+                key = (el.get('type'), el.get('id'))
+                if key in seen:
+                    continue
+                seen.add(key)
+                elements.append(el)
+        merged = {'elements': elements}
 
-if __name__ == '__main__':
-    # When running as a script, process all jurisdictions
-    generate_all_data()
+    if osm_base:
+        merged['osmBase'] = osm_base
+    return merged
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of Overpass responses.
+
+    Entries are keyed by a hash of the exact query text and bbox and stored
+    gzip-compressed (``<key>.json.gz``) next to a small ``<key>.meta.json``
+    with the fetch time. Entries older than ``ttl_seconds`` are ignored
+    unless stale entries are explicitly allowed (offline mode). The data
+    file's mtime records the last access, and the least recently used
+    entries are evicted once the cache grows past ``max_bytes``.
+
+    Queries that hit the Overpass limits are cached as a marker so later
+    runs go straight to tiling. Timeouts are not: they may be an outage.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(query: str, bbox: List[float] = None) -> str:
+        return hashlib.sha256(f"{query}\n{json.dumps(bbox)}".encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str) -> tuple:
+        base = os.path.join(self.directory, key)
+        return base + '.json.gz', base + '.meta.json'
+
+    def _meta(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not meta.get('tooLarge') and not os.path.exists(data_path):
+            return None
+        if meta.get('tooLarge') == OverpassTimedOutEverywhere.MESSAGE:
+            return None  # timeout marker written by an older version
+        if not allow_stale and time.time() - meta['fetched'] > self.ttl_seconds:
+            return None
+        return meta
+
+    def get(self, key: str, stream: bool = False, allow_stale: bool = False) -> Optional[Dict]:
+        """
+        Cached response for a key, or None.
+
+        Returns a decoded response, or with ``stream`` one decompressed into a
+        temporary file. Raises OverpassQueryTooLarge for a cached limit marker.
+        """
+        meta = self._meta(key, allow_stale)
+        if meta is None:
+            return None
+        if meta.get('tooLarge'):
+            raise OverpassQueryTooLarge(meta['tooLarge'])
+
+        data_path, _ = self._paths(key)
+        try:
+            os.utime(data_path)  # last access for LRU eviction
+            if stream:
+                fd, path = tempfile.mkstemp(prefix='overpass_', suffix='.json', dir=CONFIG['stream_dir'])
+                with gzip.open(data_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, CONFIG['stream_chunk_size'])
+                return {'elements_files': [path]}
+            with gzip.open(data_path, 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def _write_meta(self, key: str, meta: Dict):
+        _, meta_path = self._paths(key)
+        tmp_path = f'{meta_path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def put(self, key: str, data: Dict, bbox: List[float] = None):
+        """Store a fetched response (decoded or streamed to files)."""
+        data_path, _ = self._paths(key)
+        tmp_path = f'{data_path}.{threading.get_ident()}.tmp'
+
+        with gzip.open(tmp_path, 'wb', compresslevel=CONFIG['cache_compress_level']) as f:
+            if 'elements_files' in data:
+                for path in data['elements_files']:
+                    with open(path, 'rb') as src:
+                        shutil.copyfileobj(src, f, CONFIG['stream_chunk_size'])
+            else:
+                f.write(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        os.replace(tmp_path, data_path)
+
+        self._write_meta(key, {'fetched': time.time(), 'bbox': bbox,
+                               'bytes': os.path.getsize(data_path)})
+        self.evict()
+
+    def put_too_large(self, key: str, remark: str, bbox: List[float] = None):
+        """Remember that a query exceeds the Overpass limits."""
+        self._write_meta(key, {'fetched': time.time(), 'bbox': bbox, 'tooLarge': remark})
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits ``max_bytes``."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json.gz'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name[:-len('.json.gz')]))
+                total += st.st_size
+
+            for _, size, key in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for path in self._paths(key):
+                    if os.path.exists(path):
+                        os.remove(path)
+                total -= size
+
+
+_response_cache = None
+
+
+def open_response_cache(output_dir: str = 'data') -> Optional[ResponseCache]:
+    """
+    Set up the response cache used by fetch_overpass.
+
+    The TTL defaults to ``config.staticMaxAgeDays`` from the output
+    manifest, so cached responses expire on the same schedule as the
+    generated files.
+    """
+    global _response_cache
+
+    if not CONFIG['cache_enabled']:
+        _response_cache = None
+        return None
+
+    ttl_days = CONFIG['cache_ttl_days']
+    if ttl_days is None:
+        ttl_days = 60
+        manifest_path = os.path.join(output_dir, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                ttl_days = json.load(f).get('config', {}).get('staticMaxAgeDays', ttl_days)
+
+    _response_cache = ResponseCache(CONFIG['cache_dir'], ttl_days * 86400, CONFIG['cache_max_bytes'])
+    return _response_cache
+
+
+def fetch_overpass(query: str, scheduler: ServerScheduler, label: str,
+                   stream: bool = False, bbox: List[float] = None, refresh: bool = False) -> Optional[Dict]:
+    """
+    Run one Overpass query, answering from the response cache when possible.
+
+    ``CONFIG['cache_mode']`` is 'normal' (use fresh cache entries, fetch
+    and store the rest), 'refresh' (always fetch, then store) or 'offline'
+    (only use the cache, stale entries included, never the network).
+    ``refresh`` switches a 'normal' cache to 'refresh' for this query.
+    """
+    cache = _response_cache
+    mode = CONFIG['cache_mode']
+    if refresh and mode == 'normal':
+        mode = 'refresh'
+    key = ResponseCache.key(query, bbox) if cache else None
+
+    if cache and mode != 'refresh':
+        with _metrics.stage('cache'):
+            cached = cache.get(key, stream=stream, allow_stale=mode == 'offline')
+        if cached is not None:
+            _metrics.count('cacheHits')
+            print(f"    [{label}] Using cached response")
+            return cached
+
+    if mode == 'offline':
+        print(f"    [{label}] Not in cache (offline)")
+        return None
+
+    try:
+        data = fetch_overpass_network(query, scheduler, label, stream=stream)
+    except OverpassQueryTooLarge as e:
+        # Timeouts may be a passing outage; only real limit remarks are remembered
+        if cache and not isinstance(e, OverpassTimedOutEverywhere):
+            cache.put_too_large(key, str(e), bbox)
+        raise
+
+    if data and cache:
+        cache.put(key, data, bbox)
+    return data
+
+
+def fetch_overpass_network(query: str, scheduler: ServerScheduler, label: str,
+                           stream: bool = False) -> Optional[Dict]:
+    """
+    Run one Overpass query, trying servers in the order the scheduler ranks them.
+
+    Before sending the query the server's ``/api/status`` is checked; a server
+    whose next free slot is more than ``max_slot_wait`` away is put back so
+    another one can be picked. Raises OverpassQueryTooLarge if a server
+    reports the query hit its limits, or if every server it was tried on timed
+    out (a mix of timeouts and other failures just returns None).
+    With ``stream`` the response is downloaded to a temporary file.
+    Returns None without sending anything when the cache mode is 'offline'.
+    """
+    if CONFIG['cache_mode'] == 'offline':
+        print(f"    [{label}] Not sent (offline)")
+        return None
+
+    tried = set()
+    deferrals = 0
+    timeouts = 0
+    while True:
+        with scheduler.slot(exclude=tried) as server:
+            if server is None:
+                if tried and timeouts == len(tried):
+                    raise OverpassTimedOutEverywhere()
+                return None
+
+            wait = scheduler.health.check_status(server)
+            if wait and wait > CONFIG['max_slot_wait'] and deferrals < len(scheduler.servers):
+                deferrals += 1
+                print(f"    [{label}] {server_name(server)} busy for {wait:.0f}s, "
+                      f"looking for another server...")
+                continue
+            if wait:
+                with _metrics.stage('queue'):
+                    time.sleep(min(wait, CONFIG['max_slot_wait']))
+
+            tried.add(server)
+            print(f"    [{label}] Trying {server_name(server)}...")
+
+            stream_to = None
+            if stream:
+                fd, stream_to = tempfile.mkstemp(prefix='overpass_', suffix='.json',
+                                                 dir=CONFIG['stream_dir'])
+                os.close(fd)
+
+            data = None
+            try:
+                data = fetch_with_retry(server, query, health=scheduler.health, stream_to=stream_to)
+            except OverpassTimeout:
+                timeouts += 1
+            finally:
+                if stream_to is not None and not data and os.path.exists(stream_to):
+                    os.remove(stream_to)
+
+        if data and ('elements' in data or 'elements_files' in data):
+            return data
+
+
+def fetch_bbox(bbox: List[float], scheduler: ServerScheduler, label: str,
+               depth: int = 0, stream: bool = False, refresh: bool = False) -> Optional[Dict]:
+    """
+    Fetch all roads in a bbox, splitting it into quadrants when it is too large.
+
+    Quadrants are fetched in parallel and any quadrant that still exceeds the
+    Overpass limits is split again, up to ``max_tile_depth`` levels. Ways that
+    cross quadrant edges are returned once. ``refresh`` bypasses cached
+    responses (see fetch_overpass).
+    """
+    try:
+        return fetch_overpass(build_overpass_query(bbox), scheduler, label, stream=stream, bbox=bbox,
+                              refresh=refresh)
+    except OverpassQueryTooLarge as e:
+        if not CONFIG['adaptive_tiling'] or depth >= CONFIG['max_tile_depth']:
+            print(f"    [{label}] Query too large: {e}")
+            return None
+        print(f"    [{label}] Query too large ({e}), splitting into 4 tiles...")
+
+    tiles = split_bbox(bbox)
+    with ThreadPoolExecutor(max_workers=len(tiles)) as pool:
+        futures = [
+            pool.submit(_metrics.bind(fetch_bbox), tile, scheduler, f"{label}/{name}", depth + 1, stream, refresh)
+            for name, tile in tiles.items()
+        ]
+        results = [f.result() for f in futures]
+
+    if any(r is None for r in results):
+        for r in results:
+            if r is not None:
+                discard_response(r)
+        return None
+    return merge_overpass_results(results)
+
+
+def fetch_bboxes(bboxes: List[List[float]], scheduler: ServerScheduler, label: str,
+                 stream: bool = False, refresh: bool = False) -> Optional[Dict]:
+    """
+    Fetch all roads in several bboxes with one combined query.
+
+    Falls back to fetch_bbox per bbox (with its tiling) when the combined
+    query exceeds the Overpass limits.
+    """
+    if len(bboxes) == 1:
+        return fetch_bbox(bboxes[0], scheduler, label, stream=stream, refresh=refresh)
+
+    try:
+        return fetch_overpass(build_overpass_query(*bboxes), scheduler, label,
+                              stream=stream, bbox=union_bbox(bboxes), refresh=refresh)
+    except OverpassQueryTooLarge as e:
+        print(f"    [{label}] Combined query too large ({e}), fetching {len(bboxes)} parts separately...")
+
+    results = []
+    for i, bbox in enumerate(bboxes):
+        result = fetch_bbox(bbox, scheduler, f"{label}/{i}", stream=stream, refresh=refresh)
+        if result is None:
+            for r in results:
+                discard_response(r)
+            return None
+        results.append(result)
+    return merge_overpass_results(results)
+
+
+def fetch_road_data(jurisdiction_id: str, scheduler: ServerScheduler = None,
+                    stream: bool = False, refresh: bool = False) -> Optional[Dict]:
+    """
+    Fetch road data from Overpass API.
+
+    Each attempt goes to the untried server the scheduler ranks best. Large
+    jurisdictions that exceed the Overpass limits are fetched as tiles. With
+    ``stream`` the responses are left on disk for iter_response_elements.
+    ``refresh`` bypasses cached responses.
+    """
+    j = JURISDICTIONS.get(jurisdiction_id)
+    if not j:
+        print(f"Unknown jurisdiction: {jurisdiction_id}")
+        return None
+
+    if scheduler is None:
+        scheduler = ServerScheduler(CONFIG['overpass_servers'], min_request_interval=0)
+
+    return fetch_bbox(j['bbox'], scheduler, jurisdiction_id, stream=stream, refresh=refresh)
+
+
+def build_probe_query(bbox: List[float], since: str) -> str:
+    """
+    Overpass query counting a bbox's highway ways and what changed since ``since``.
+
+    Returns three counts: all ways, ways edited after ``since``, and nodes
+    of those ways edited after ``since`` (moving a node changes a road's
+    geometry without touching the way itself).
+    """
+    west, south, east, north = bbox
+
+    way_queries = ''.join([
+        f'way["highway"="{t}"]({south},{west},{north},{east});'
+        for t in HIGHWAY_TYPES
+    ])
+
+    return (f'[out:json][timeout:120];({way_queries})->.w;'
+            f'.w out count;'
+            f'way.w(newer:"{since}");out count;'
+            f'node(w.w)(newer:"{since}");out count;')
+
+
+def probe_jurisdiction_changed(jurisdiction_id: str, previous: Dict,
+                               scheduler: ServerScheduler) -> Optional[bool]:
+    """
+    Cheaply check whether a jurisdiction changed since its last generation.
+
+    Compares the current way count with the stored ``wayCount`` and counts
+    ways and nodes edited after the stored ``osmBase``. Returns True/False,
+    or None if the probe could not be run (treat as changed).
+    """
+    query = build_probe_query(JURISDICTIONS[jurisdiction_id]['bbox'], previous['osmBase'])
+    try:
+        data = fetch_overpass_network(query, scheduler, f'{jurisdiction_id}/probe')
+    except OverpassQueryTooLarge:
+        return None
+
+    counts = [el for el in (data or {}).get('elements', []) if el.get('type') == 'count']
+    if len(counts) != 3:
+        return None
+
+    total, new_ways, new_nodes = (int(c.get('tags', {}).get('total', -1)) for c in counts)
+    print(f"    [{jurisdiction_id}] Probe: {total} ways ({previous.get('wayCount')} before), "
+          f"{new_ways} ways and {new_nodes} nodes edited since {previous['osmBase']}")
+    return not (total == previous.get('wayCount') and new_ways == 0 and new_nodes == 0)
+
+
+_ELEMENTS_START = re.compile(r'"elements"\s*:\s*\[')
+_REMARK = re.compile(r'"remark"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def read_tail_remark(path: str, tail_bytes: int = 65536) -> Optional[str]:
+    """Overpass puts its ``remark`` after ``elements``; read it from the end of a file."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - tail_bytes))
+        tail = f.read().decode('utf-8', errors='replace')
+    match = _REMARK.search(tail)
+    return json.loads(match.group(1)) if match else None
+
+
+class OverpassStreamReader:
+    """
+    Incrementally parse the ``elements`` array of an Overpass JSON file.
+
+    Elements are decoded one at a time from a rolling buffer, so memory use
+    is bounded by ``stream_chunk_size`` plus the largest single element
+    rather than by the size of the response.
+    """
+
+    def __init__(self, path: str, chunk_size: int = None):
+        self.path = path
+        self.chunk_size = chunk_size or CONFIG['stream_chunk_size']
+        self.remark = None
+
+    def __iter__(self):
+        decoder = json.JSONDecoder()
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            buf = ''
+            while True:
+                match = _ELEMENTS_START.search(buf)
+                if match:
+                    buf = buf[match.end():]
+                    break
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    raise ValueError(f"No elements array in {self.path}")
+                # Keep a little context in case the key straddles two chunks
+                buf = buf[-32:] + chunk
+
+            pos = 0
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos == len(buf):
+                    buf, pos = f.read(self.chunk_size), 0
+                    if not buf:
+                        raise ValueError(f"Truncated Overpass response in {self.path}")
+                    continue
+
+                if buf[pos] == ']':
+                    rest = (buf[pos + 1:] + f.read()).strip().lstrip(',')
+                    try:
+                        self.remark = json.loads('{' + rest).get('remark')
+                    except ValueError:
+                        self.remark = None
+                    return
+
+                try:
+                    element, pos = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        raise ValueError(f"Truncated Overpass response in {self.path}")
+                    buf, pos = buf[pos:] + chunk, 0
+                    continue
+
+                yield element
+
+
+def iter_response_elements(osm_data: Dict):
+    """
+    Iterate the elements of a fetched response, decoded or streamed.
+
+    Streamed responses spanning several tile files are deduplicated by
+    element type and id as they are read.
+    """
+    if 'elements' in osm_data:
+        yield from osm_data['elements']
+        return
+
+    files = osm_data.get('elements_files', [])
+    seen = set() if len(files) > 1 else None
+    for path in files:
+        for el in _metrics.timed_iter(OverpassStreamReader(path), 'decode'):
+            if seen is not None:
+                key = (el.get('type'), el.get('id'))
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield el
+
+
+def discard_response(osm_data: Dict):
+    """Delete the temporary files behind a streamed response."""
+    for path in osm_data.get('elements_files', []):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _make_road(el: Dict, coords: List[List[float]], length: float) -> Dict:
+    tags = el.get('tags', {})
+    highway = tags.get('highway', '')
+    func_class = OSM_TO_VDOT.get(highway, '7')
+
+    return {
+        'id': el['id'],
+        'name': tags.get('name') or tags.get('ref') or f"Unnamed {highway}",
+        'highway': highway,
+        'funcClass': func_class,
+        'ref': tags.get('ref', ''),
+        'lanes': tags.get('lanes', ''),
+        'maxspeed': tags.get('maxspeed', ''),
+        'surface': tags.get('surface', ''),
+        'length': round(length, 3),
+        'coords': coords
+    }
+
+
+def road_from_element(el: Dict) -> Optional[tuple]:
+    """Convert an OSM way element into (road record, unrounded length in miles)."""
+    if el.get('type') != 'way' or not el.get('geometry'):
+        return None
+
+    coords = [[p['lat'], p['lon']] for p in el['geometry']]
+    length = calc_length(coords)
+    return _make_road(el, coords, length), length
+
+
+@timed('build')
+def roads_from_batch(ways: List[Dict]) -> List[tuple]:
+    """
+    Convert a batch of way elements into (road record, length) pairs.
+
+    With NumPy the batch is packed into flat arrays, every length is computed
+    in one vectorized pass and coordinates are sliced back out per way.
+    Otherwise each way goes through road_from_element.
+    """
+    _metrics.count('elements', len(ways))
+    _metrics.count('vertices', sum(len(el['geometry']) for el in ways))
+    if np is None or not CONFIG['use_numpy'] or not ways:
+        return [road_from_element(el) for el in ways]
+
+    lat, lon, offsets = pack_way_geometries(ways)
+    lengths = calc_lengths_packed(lat, lon, offsets).tolist()
+    points = np.column_stack((lat, lon)).tolist()
+    offsets = offsets.tolist()
+
+    return [
+        (_make_road(el, points[offsets[k]:offsets[k + 1]], lengths[k]), lengths[k])
+        for k, el in enumerate(ways)
+    ]
+
+
+def iter_roads(elements: Iterable[Dict], batch_size: int = None):
+    """
+    Yield (road record, unrounded length) for every way in an element stream.
+
+    Ways are converted ``geometry_batch_size`` at a time so the vectorized
+    geometry path also works on streamed input.
+    """
+    if batch_size is None:
+        batch_size = CONFIG['geometry_batch_size']
+
+    batch = []
+    for el in elements:
+        if el.get('type') != 'way' or not el.get('geometry'):
+            continue
+        batch.append(el)
+        if len(batch) >= batch_size:
+            yield from roads_from_batch(batch)
+            batch = []
+
+    if batch:
+        yield from roads_from_batch(batch)
+
+
+# Road fields that must be equal for two ways to be merged into one road
+MERGE_FIELDS = ('name', 'highway', 'funcClass', 'ref', 'lanes', 'maxspeed', 'surface')
+
+
+class _RoadSpool:
+    """(road, length) pairs in a temporary JSON-lines file, read back by position."""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix='merge_', suffix='.jsonl', dir=CONFIG['stream_dir'])
+        self._file = os.fdopen(fd, 'w+b')
+        self._offsets = array('q', [0])
+
+    def append(self, pair: tuple):
+        self._file.write(json.dumps(pair, separators=(',', ':')).encode('utf-8'))
+        self._offsets.append(self._file.tell())
+
+    def __getitem__(self, i: int) -> tuple:
+        self._file.seek(self._offsets[i])
+        road, length = json.loads(self._file.read(self._offsets[i + 1] - self._offsets[i]))
+        return road, length
+
+    def close(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+def _next_segment(candidates: Optional[List[int]], used: List[bool]) -> Optional[int]:
+    # Only continue through a node where exactly two matching segments end
+    if candidates is None or len(candidates) != 2:
+        return None
+    for k in candidates:
+        if not used[k]:
+            return k
+    return None
+
+
+def plan_segment_merges(ends: List[Optional[tuple]]) -> List[List[tuple]]:
+    """
+    Chains of roads to join, from each road's (merge key, first point, last point).
+
+    ``ends[i]`` is None for a road that cannot be merged. Returns one chain
+    per output road, ordered by its first road, as [(road number,
+    reversed), ...] in polyline order.
+    """
+    by_end = {}
+    for i, end in enumerate(ends):
+        if end is not None:
+            key, first, last = end
+            by_end.setdefault((key, first), []).append(i)
+            by_end.setdefault((key, last), []).append(i)
+
+    used = [False] * len(ends)
+    chains = []
+    for i, end in enumerate(ends):
+        if used[i]:
+            continue
+        used[i] = True
+        if end is None:
+            chains.append([(i, False)])
+            continue
+
+        key, first, last = end
+        tail, head = [(i, False)], []
+        # Walk forward from the last point, then backward from the first
+        for links, point, forward in ((tail, last, True), (head, first, False)):
+            while True:
+                k = _next_segment(by_end.get((key, point)), used)
+                if k is None:
+                    break
+                used[k] = True
+                _, k_first, k_last = ends[k]
+                leaves_from_first = k_first == point
+                # Forward, a segment leaving from its first point keeps its direction;
+                # backward, a segment arriving at its last point does
+                links.append((k, not leaves_from_first if forward else leaves_from_first))
+                point = k_last if leaves_from_first else k_first
+
+        chains.append(head[::-1] + tail)
+    return chains
+
+
+def _join_chain(pairs: List[tuple]) -> tuple:
+    """Join the [((road, length), reversed), ...] of a chain into one (road, length)."""
+    (road, length), _ = pairs[0]
+    if len(pairs) == 1:
+        return road, length
+
+    points = []
+    way_ids = []
+    total = 0.0
+    for (segment, segment_length), reverse in pairs:
+        coords = segment['coords'][::-1] if reverse else segment['coords']
+        points.extend(coords[1:] if points else coords)
+        way_ids.append(segment['id'])
+        total += segment_length
+
+    combined = {'id': min(way_ids), 'wayIds': way_ids}
+    combined.update((k, v) for k, v in road.items() if k not in ('id', 'length', 'coords'))
+    combined['length'] = round(total, 3)
+    combined['coords'] = points
+    return combined, total
+
+
+def merge_road_segments(pairs: Iterable[tuple], spool: bool = False):
+    """
+    Join (road, length) pairs that continue each other into longer roads.
+
+    OSM splits a street into a new way at every tag change, so one street
+    arrives as many short ways. Two roads are joined where an end of one
+    meets an end of the other, they agree on every MERGE_FIELDS value and
+    no third matching road ends at the same node (forks and crossings of
+    the same street stay separate). Ends are matched by coordinates: geom
+    output and extracts give every node one exact position, so equal
+    endpoints are a shared node.
+
+    A merged road gets the smallest of its way ids as ``id``, the original
+    ids in polyline order as ``wayIds`` and the summed length. Roads that
+    were not merged are yielded unchanged, in their original order.
+
+    Only each road's merge key and endpoints are kept for planning; with
+    ``spool`` the roads themselves wait in a temporary file (streaming),
+    otherwise in a list.
+    """
+    store = _RoadSpool() if spool else []
+    try:
+        keys = {}
+        ends = []
+        for road, length in pairs:
+            coords = road['coords']
+            if len(coords) < 2 or coords[0] == coords[-1]:
+                ends.append(None)  # closed ways (roundabouts) are left alone
+            else:
+                key = keys.setdefault(tuple(road.get(field, '') for field in MERGE_FIELDS), len(keys))
+                ends.append((key, tuple(coords[0]), tuple(coords[-1])))
+            store.append((road, length))
+        keys = None
+
+        for chain in plan_segment_merges(ends):
+            yield _join_chain([(store[i], reverse) for i, reverse in chain])
+    finally:
+        if spool:
+            store.close()
+
+
+def process_road_data(osm_data: Dict, jurisdiction_id: str, pairs: Iterable[tuple] = None) -> Dict:
+    """Process raw OSM data (or already built (road, length) ``pairs``) into our format."""
+    j = JURISDICTIONS[jurisdiction_id]
+    roads = []
+    total_miles = 0.0
+
+    fc_counts = {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0, '6': 0, '7': 0}
+
+    if pairs is None:
+        pairs = iter_roads(osm_data.get('elements', []))
+    for road, length in pairs:
+        roads.append(road)
+        total_miles += length
+        fc_counts[road['funcClass']] += 1
+
+    return {
+        'jurisdiction': jurisdiction_id,
+        'jurisdictionName': j['name'],
+        'generated': datetime.utcnow().isoformat() + 'Z',
+        'version': '1.0',
+        'roadCount': len(roads),
+        'totalMiles': round(total_miles, 2),
+        'fcBreakdown': fc_counts,
+        'roads': roads
+    }
+
+
+def write_json_atomic(path: str, data: Any, **dump_kwargs):
+    """Write JSON through a temp file and rename, so a killed run never leaves a truncated file."""
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@timed('write')
+def save_road_data(data: Dict, jurisdiction_id: str, output_dir: str) -> str:
+    """Save road data to file."""
+    roads_dir = os.path.join(output_dir, 'roads')
+    os.makedirs(roads_dir, exist_ok=True)
+
+    file_path = os.path.join(roads_dir, f'{jurisdiction_id}.json')
+    write_json_atomic(file_path, data, indent=2)
+    _metrics.count('bytesWritten', os.path.getsize(file_path))
+
+    print(f"    Saved to {file_path}")
+    return file_path
+
+
+@timed('write')
+def write_road_data_stream(roads: Iterable[tuple], jurisdiction_id: str, output_dir: str,
+                           sinks: Iterable = ()) -> Dict:
+    """
+    Write roads to ``roads/<id>.json`` one at a time as they are produced.
+
+    Takes (road, length) pairs from iter_roads. The file has the same fields
+    as save_road_data output, with the summary fields written after
+    ``roads`` because they are only known at the end. Each road is also
+    passed to the ``add`` method of every sink (e.g. RoadBinaryWriter).
+    Returns the summary (everything except ``roads``).
+    """
+    j = JURISDICTIONS[jurisdiction_id]
+    roads_dir = os.path.join(output_dir, 'roads')
+    os.makedirs(roads_dir, exist_ok=True)
+
+    summary = {
+        'jurisdiction': jurisdiction_id,
+        'jurisdictionName': j['name'],
+        'generated': datetime.utcnow().isoformat() + 'Z',
+        'version': '1.0'
+    }
+    total_miles = 0.0
+    road_count = 0
+    fc_counts = {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0, '6': 0, '7': 0}
+
+    file_path = os.path.join(roads_dir, f'{jurisdiction_id}.json')
+    tmp_path = f'{file_path}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write('{\n')
+            for key, value in summary.items():
+                f.write(f'  {json.dumps(key)}: {json.dumps(value)},\n')
+            f.write('  "roads": [')
+
+            for road, length in roads:
+                f.write(',\n    ' if road_count else '\n    ')
+                f.write(json.dumps(road, indent=2).replace('\n', '\n    '))
+                for sink in sinks:
+                    sink.add(road)
+                road_count += 1
+                total_miles += length
+                fc_counts[road['funcClass']] += 1
+
+            summary['roadCount'] = road_count
+            summary['totalMiles'] = round(total_miles, 2)
+            summary['fcBreakdown'] = fc_counts
+
+            f.write('\n  ],\n' if road_count else '],\n')
+            f.write(f'  "roadCount": {road_count},\n')
+            f.write(f'  "totalMiles": {json.dumps(summary["totalMiles"])},\n')
+            f.write('  "fcBreakdown": ' + json.dumps(fc_counts, indent=2).replace('\n', '\n  ') + '\n')
+            f.write('}')
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _metrics.count('bytesWritten', os.path.getsize(file_path))
+
+    print(f"    Saved to {file_path}")
+    return summary
+
+
+# ============================================================
+# BINARY ROAD FORMAT
+# ============================================================
+#
+# roads/<id>.bin holds the same roads as roads/<id>.json in a layout the
+# browser can map straight onto typed arrays:
+#
+#   bytes 0-3   magic b'CLRB'
+#   bytes 4-7   uint32 length of the JSON header that follows
+#   header      UTF-8 JSON: the summary fields of the JSON file plus
+#               coordScale, stringFields and the byte offset/length/type of
+#               every section below
+#   sections    little-endian, each starting on an 8-byte boundary
+#
+#   ids           float64[roadCount]      OSM way ids
+#   lengths       uint32[roadCount]       length in thousandths of a mile
+#   funcClass     uint8[roadCount]
+#   strings       uint32[roadCount * 6]   string table index per STRING_FIELDS
+#   offsets       uint32[roadCount + 1]   first point of each road
+#   coords        int32[points * 2]       lat, lon * coordScale; the first
+#                                         point of a road is absolute, the
+#                                         rest are deltas from the previous
+#   stringOffsets uint32[strings + 1]     byte offsets into stringData
+#   stringData    uint8[]                 UTF-8 text of the string table
+#   wayOffsets    uint32[roadCount + 1]   first entry of each road in wayIds
+#   wayIds        float64[ways]           OSM way ids merged into each road
+#                                         (just its own id if not merged)
+
+BINARY_MAGIC = b'CLRB'
+BINARY_FORMAT_VERSION = 2
+BINARY_STRING_FIELDS = ['name', 'highway', 'ref', 'lanes', 'maxspeed', 'surface']
+BINARY_SECTIONS = [
+    ('ids', 'd', 'float64'),
+    ('lengths', 'I', 'uint32'),
+    ('funcClass', 'B', 'uint8'),
+    ('strings', 'I', 'uint32'),
+    ('offsets', 'I', 'uint32'),
+    ('coords', 'i', 'int32'),
+    ('stringOffsets', 'I', 'uint32'),
+    ('stringData', 'B', 'uint8'),
+    ('wayOffsets', 'I', 'uint32'),
+    ('wayIds', 'd', 'float64')
+]
+
+
+def _little_endian(arr: array) -> bytes:
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+class RoadBinaryWriter:
+    """
+    Accumulates roads into the compact binary layout and writes the file.
+
+    Roads are added one at a time (so it can sit behind
+    write_road_data_stream) and held only as typed arrays, a few bytes per
+    point instead of nested Python lists.
+    """
+
+    def __init__(self, coord_scale: int = None):
+        self.coord_scale = coord_scale or CONFIG['binary_coord_scale']
+        self._arrays = {name: array(code) for name, code, _ in BINARY_SECTIONS}
+        self._arrays['offsets'].append(0)
+        self._arrays['wayOffsets'].append(0)
+        self._string_index = {}
+
+    def _intern(self, text: str) -> int:
+        index = self._string_index.get(text)
+        if index is None:
+            index = self._string_index[text] = len(self._string_index)
+        return index
+
+    def add(self, road: Dict):
+        a = self._arrays
+        a['ids'].append(float(road['id']))
+        a['lengths'].append(round(road['length'] * 1000))
+        a['funcClass'].append(int(road['funcClass']))
+        a['strings'].extend(self._intern(str(road.get(field, ''))) for field in BINARY_STRING_FIELDS)
+
+        coords = a['coords']
+        prev_lat = prev_lon = 0
+        for i, (lat, lon) in enumerate(road['coords']):
+            q_lat = round(lat * self.coord_scale)
+            q_lon = round(lon * self.coord_scale)
+            if i == 0:
+                coords.extend((q_lat, q_lon))
+            else:
+                coords.extend((q_lat - prev_lat, q_lon - prev_lon))
+            prev_lat, prev_lon = q_lat, q_lon
+        a['offsets'].append(len(coords) // 2)
+
+        a['wayIds'].extend(float(way_id) for way_id in road.get('wayIds') or [road['id']])
+        a['wayOffsets'].append(len(a['wayIds']))
+
+    @timed('write')
+    def write(self, path: str, summary: Dict) -> int:
+        """Write the file with ``summary`` in its header. Returns bytes written."""
+        a = self._arrays
+        string_data = bytearray()
+        a['stringOffsets'] = array('I', [0])
+        for text in self._string_index:
+            string_data += text.encode('utf-8')
+            a['stringOffsets'].append(len(string_data))
+        a['stringData'] = array('B', bytes(string_data))
+
+        header = {k: v for k, v in summary.items() if k != 'roads'}
+        header.update({
+            'format': 'crashlens-roads',
+            'formatVersion': BINARY_FORMAT_VERSION,
+            'coordScale': self.coord_scale,
+            'pointCount': len(a['coords']) // 2,
+            'stringFields': BINARY_STRING_FIELDS,
+            'sections': {}
+        })
+
+        # Section offsets depend on the header length and vice versa; the
+        # header is padded to a fixed size once the offsets are known
+        payloads = [(name, js_type, _little_endian(a[name])) for name, _, js_type in BINARY_SECTIONS]
+        header_len = 0
+        while True:
+            offset = _align8(8 + header_len)
+            for name, js_type, payload in payloads:
+                header['sections'][name] = {'offset': offset, 'length': len(payload), 'type': js_type}
+                offset = _align8(offset + len(payload))
+            encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+            if len(encoded) <= header_len:
+                break
+            header_len = _align8(len(encoded) + 8) - 8
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(BINARY_MAGIC)
+            f.write(struct.pack('<I', header_len))
+            f.write(encoded.ljust(header_len, b' '))
+            for name, _, payload in payloads:
+                f.write(b'\0' * (header['sections'][name]['offset'] - f.tell()))
+                f.write(payload)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        _metrics.count('bytesWritten', size)
+        return size
+
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def write_road_binary(data: Dict, jurisdiction_id: str, output_dir: str) -> str:
+    """Write process_road_data output as roads/<id>.bin."""
+    writer = RoadBinaryWriter()
+    for road in data['roads']:
+        writer.add(road)
+
+    file_path = os.path.join(output_dir, 'roads', f'{jurisdiction_id}.bin')
+    size = writer.write(file_path, data)
+    print(f"    Saved to {file_path} ({size / 1024:.0f} KB)")
+    return file_path
+
+
+def _parse_binary_header(raw: bytes, path: str) -> Dict:
+    if raw[:4] != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a road binary file")
+    header_len = struct.unpack_from('<I', raw, 4)[0]
+    header = json.loads(raw[8:8 + header_len])
+    if header.get('formatVersion') != BINARY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported road binary version {header.get('formatVersion')}")
+    return header
+
+
+def read_road_binary_header(path: str) -> Dict:
+    """The JSON header of a roads/<id>.bin file (summary fields, coordScale, sections)."""
+    with open(path, 'rb') as f:
+        raw = f.read(8)
+        raw += f.read(struct.unpack_from('<I', raw, 4)[0]) if raw[:4] == BINARY_MAGIC else b''
+    return _parse_binary_header(raw, path)
+
+
+def read_road_binary(path: str) -> Dict:
+    """Read a roads/<id>.bin file back into the process_road_data shape."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    header = _parse_binary_header(raw, path)
+
+    sections = {}
+    for name, code, _ in BINARY_SECTIONS:
+        info = header['sections'][name]
+        arr = array(code)
+        arr.frombytes(raw[info['offset']:info['offset'] + info['length']])
+        if sys.byteorder == 'big':
+            arr.byteswap()
+        sections[name] = arr
+
+    string_data = sections['stringData'].tobytes()
+    string_offsets = sections['stringOffsets']
+    table = [string_data[string_offsets[i]:string_offsets[i + 1]].decode('utf-8')
+             for i in range(len(string_offsets) - 1)]
+
+    scale = header['coordScale']
+    coords = sections['coords']
+    offsets = sections['offsets']
+    n_fields = len(header['stringFields'])
+    roads = []
+
+    for k in range(len(sections['ids'])):
+        points = []
+        lat = lon = 0
+        for p in range(offsets[k], offsets[k + 1]):
+            if p == offsets[k]:
+                lat, lon = coords[2 * p], coords[2 * p + 1]
+            else:
+                lat += coords[2 * p]
+                lon += coords[2 * p + 1]
+            points.append([lat / scale, lon / scale])
+
+        road = {'id': int(sections['ids'][k])}
+        way_ids = sections['wayIds'][sections['wayOffsets'][k]:sections['wayOffsets'][k + 1]]
+        if len(way_ids) > 1:
+            road['wayIds'] = [int(way_id) for way_id in way_ids]
+        for i, field in enumerate(header['stringFields']):
+            road[field] = table[sections['strings'][k * n_fields + i]]
+        road['funcClass'] = str(sections['funcClass'][k])
+        road['length'] = sections['lengths'][k] / 1000
+        road['coords'] = points
+        roads.append(road)
+
+    data = {k: v for k, v in header.items()
+            if k not in ('format', 'formatVersion', 'coordScale', 'pointCount', 'stringFields', 'sections')}
+    data['roads'] = roads
+    return data
+
+
+def validate_road_binary(path: str, data: Dict) -> List[str]:
+    """
+    Compare a binary file against the process_road_data output it came from.
+
+    Strings, ids, classes and summary fields must match exactly, lengths to
+    the stored 0.001 mile and coordinates to within half a quantization step
+    (0.5 / coordScale degrees with the file's own coordScale, about 5 cm at
+    the default scale). Returns a list of problems; empty means the file
+    round-trips.
+    """
+    decoded = read_road_binary(path)
+    tolerance = 0.5 / read_road_binary_header(path)['coordScale'] + 1e-9
+    problems = []
+
+    for key in ('jurisdiction', 'roadCount', 'totalMiles', 'fcBreakdown'):
+        if decoded.get(key) != data.get(key):
+            problems.append(f"{key}: {decoded.get(key)!r} != {data.get(key)!r}")
+    if len(decoded['roads']) != len(data['roads']):
+        problems.append(f"road count {len(decoded['roads'])} != {len(data['roads'])}")
+        return problems
+
+    for got, want in zip(decoded['roads'], data['roads']):
+        for field in ['id', 'funcClass', 'wayIds'] + BINARY_STRING_FIELDS:
+            if got.get(field, '') != want.get(field, ''):
+                problems.append(f"road {want['id']} {field}: {got.get(field)!r} != {want.get(field)!r}")
+        if abs(got['length'] - want['length']) > 0.0005:
+            problems.append(f"road {want['id']} length: {got['length']} != {want['length']}")
+        if len(got['coords']) != len(want['coords']):
+            problems.append(f"road {want['id']} has {len(got['coords'])} points, expected {len(want['coords'])}")
+            continue
+        for (lat, lon), (w_lat, w_lon) in zip(got['coords'], want['coords']):
+            if abs(lat - w_lat) > tolerance or abs(lon - w_lon) > tolerance:
+                problems.append(f"road {want['id']} point off by more than {tolerance:g} deg")
+                break
+
+    return problems
+
+
+# ============================================================
+# LEVEL OF DETAIL
+# ============================================================
+
+def pixel_size_degrees(zoom: int) -> float:
+    """Width of one 256px web-map tile pixel in degrees of longitude at a zoom level."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def simplify_polyline(coords: List[List[float]], tolerance: float,
+                      locked: Iterable[int] = ()) -> List[List[float]]:
+    """
+    Douglas-Peucker simplification of a [[lat, lon], ...] polyline.
+
+    ``tolerance`` is in degrees of latitude; longitudes are scaled by the
+    cosine of the latitude so the tolerance is the same in every direction.
+    The endpoints and every index in ``locked`` are always kept, and the
+    line is simplified independently between them.
+    """
+    n = len(coords)
+    if n <= 2:
+        return list(coords)
+
+    k = math.cos(math.radians(coords[0][0]))
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    for i in locked:
+        keep[i] = True
+
+    anchors = [i for i in range(n) if keep[i]]
+    stack = list(zip(anchors, anchors[1:]))
+    tol2 = tolerance * tolerance
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        ay, ax = coords[first][0], coords[first][1] * k
+        by, bx = coords[last][0], coords[last][1] * k
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+
+        max_d2 = -1.0
+        index = first
+        for i in range(first + 1, last):
+            py, px = coords[i][0], coords[i][1] * k
+            if seg2 == 0:
+                d2 = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg2))
+                d2 = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if d2 > max_d2:
+                max_d2, index = d2, i
+
+        if max_d2 > tol2:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [c for c, kept in zip(coords, keep) if kept]
+
+
+# Junction points are compared at OSM's coordinate precision (1e-7 degrees)
+LOD_POINT_SCALE = 10 ** 7
+
+
+def quantize_point(lat: float, lon: float) -> int:
+    """A [lat, lon] point packed into one non-negative int64 at LOD_POINT_SCALE."""
+    return ((round(lat * LOD_POINT_SCALE) + 90 * LOD_POINT_SCALE) << 32) | \
+        (round(lon * LOD_POINT_SCALE) + 180 * LOD_POINT_SCALE)
+
+
+def sorted_unique(values: array, min_count: int = 1) -> array:
+    """Sorted distinct values of an array('q') occurring at least ``min_count`` times."""
+    if np is not None and CONFIG['use_numpy']:
+        unique, counts = np.unique(np.frombuffer(values, dtype=np.int64), return_counts=True)
+        return array('q', (unique[counts >= min_count] if min_count > 1 else unique).tobytes())
+
+    values = sorted(values)
+    unique = array('q')
+    i = 0
+    while i < len(values):
+        j = i + 1
+        while j < len(values) and values[j] == values[i]:
+            j += 1
+        if j - i >= min_count:
+            unique.append(values[i])
+        i = j
+    return unique
+
+
+class LodBuilder:
+    """
+    Builds simplified copies of a jurisdiction's roads for each zoom band.
+
+    Each level in ``CONFIG['lod_levels']`` is simplified with a tolerance of
+    one screen pixel at that zoom and serves zooms up to the next level; the
+    full-detail road file serves everything beyond the last level. Points
+    shared by more than one road (junctions) are never removed, so
+    simplified roads still meet where they did before.
+
+    Roads are spooled to a temporary file as they are added and only every
+    vertex's quantize_point stays in memory (8 bytes each), so LOD keeps
+    ``--stream`` memory flat. write() reads the spool back once, writing
+    every level as it goes, and removes it.
+    """
+
+    def __init__(self, levels: List[int] = None):
+        self.levels = sorted(levels if levels is not None else CONFIG['lod_levels'])
+        self._points = array('q')
+        self._spool = self._spool_path = None
+
+    def add(self, road: Dict):
+        if self._spool is None:
+            fd, self._spool_path = tempfile.mkstemp(prefix='lod_', suffix='.jsonl', dir=CONFIG['stream_dir'])
+            self._spool = os.fdopen(fd, 'wb')
+        self._spool.write(json.dumps(road, separators=(',', ':')).encode('utf-8') + b'\n')
+        self._points.extend(quantize_point(lat, lon) for lat, lon in road['coords'])
+
+    def _spooled_roads(self):
+        if self._spool_path is None:
+            return
+        self._spool.close()
+        with open(self._spool_path, 'rb') as spool:
+            for line in spool:
+                yield json.loads(line)
+
+    @timed('lod')
+    def write(self, jurisdiction_id: str, output_dir: str, summary: Dict) -> Dict:
+        """Write roads/<id>.z<zoom>.json for every level; returns the manifest ``lod`` entry."""
+        roads_dir = os.path.join(output_dir, 'roads')
+        os.makedirs(roads_dir, exist_ok=True)
+
+        # simplify_polyline measures in degrees of latitude; a pixel spans
+        # pixel_size_degrees of longitude, i.e. that times cos(lat) in latitude
+        bbox = JURISDICTIONS[jurisdiction_id]['bbox']
+        lat_scale = math.cos(math.radians((bbox[1] + bbox[3]) / 2))
+        tolerances = [pixel_size_degrees(zoom) * lat_scale * CONFIG['lod_pixel_tolerance']
+                      for zoom in self.levels]
+
+        junctions = sorted_unique(self._points, min_count=2)
+        full_vertices = len(self._points)
+        self._points = array('q')
+
+        paths = [os.path.join(roads_dir, f'{jurisdiction_id}.z{zoom}.json') for zoom in self.levels]
+        tmp_paths = [f'{path}.{threading.get_ident()}.tmp' for path in paths]
+        vertices = [0] * len(self.levels)
+        files = []
+        try:
+            for zoom, tolerance, tmp_path in zip(self.levels, tolerances, tmp_paths):
+                f = open(tmp_path, 'w')
+                files.append(f)
+                header = {k: v for k, v in summary.items() if k != 'roads'}
+                header.update({'zoom': zoom, 'tolerance': tolerance})
+                f.write(json.dumps(header, separators=(',', ':'))[:-1] + ',"roads":[')
+
+            for count, road in enumerate(self._spooled_roads()):
+                points = road['coords']
+                locked = []
+                for j, (lat, lon) in enumerate(points):
+                    key = quantize_point(lat, lon)
+                    k = bisect_left(junctions, key)
+                    if k < len(junctions) and junctions[k] == key:
+                        locked.append(j)
+                for level, (tolerance, f) in enumerate(zip(tolerances, files)):
+                    simplified = simplify_polyline(points, tolerance, locked)
+                    vertices[level] += len(simplified)
+                    f.write((',' if count else '') +
+                            json.dumps(dict(road, coords=simplified), separators=(',', ':')))
+
+            for level, f in enumerate(files):
+                f.write(f'],"vertexCount":{vertices[level]}}}')
+                f.close()
+            for tmp_path, path in zip(tmp_paths, paths):
+                os.replace(tmp_path, path)
+        finally:
+            for f in files:
+                f.close()
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            if self._spool_path is not None:
+                self._spool.close()
+                os.remove(self._spool_path)
+                self._spool = self._spool_path = None
+
+        entry = {'fullVertexCount': full_vertices, 'levels': []}
+        for zoom, path, count in zip(self.levels, paths, vertices):
+            _metrics.count('bytesWritten', os.path.getsize(path))
+            entry['levels'].append({
+                'zoom': zoom,
+                'file': f'roads/{os.path.basename(path)}',
+                'vertexCount': count
+            })
+            print(f"    Saved z{zoom} level ({count} of {full_vertices} vertices)")
+
+        return entry
+
+
+# ============================================================
+# SPATIAL TILES
+# ============================================================
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> tuple:
+    """Web-mercator (x, y) of the tile containing a point."""
+    n = 2 ** zoom
+    lat = max(-85.05112878, min(85.05112878, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bbox(zoom: int, x: int, y: int) -> List[float]:
+    """[west, south, east, north] of a web-mercator tile."""
+    n = 2 ** zoom
+
+    def tile_lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return [x / n * 360.0 - 180.0, tile_lat(y + 1), (x + 1) / n * 360.0 - 180.0, tile_lat(y)]
+
+
+_tile_locks = {}
+_tile_locks_guard = threading.Lock()
+
+
+def _tile_lock(key: str) -> threading.Lock:
+    with _tile_locks_guard:
+        return _tile_locks.setdefault(key, threading.Lock())
+
+
+class TileBuilder:
+    """
+    Buckets a jurisdiction's roads into web-mercator tiles at ``tile_zoom``.
+
+    Tiles are shared statewide (tiles/<z>/<x>/<y>.json), so a tile on a
+    jurisdiction border holds the roads of every jurisdiction touching it,
+    once per way id. A way crossing tile edges is stored whole in every
+    tile it intersects. Each tile also records which way ids each
+    jurisdiction contributed, so regenerating a jurisdiction drops roads it
+    no longer has without touching its neighbours' roads.
+
+    Roads are spooled to a temporary file as they are added; only their
+    offsets and the road numbers per tile stay in memory, so tiling keeps
+    ``--stream`` memory flat. The spool is read back and removed by write().
+    """
+
+    def __init__(self, zoom: int = None):
+        self.zoom = zoom if zoom is not None else CONFIG['tile_zoom']
+        self._tiles = {}
+        self._offsets = array('q', [0])
+        self._spool = self._spool_path = None
+
+    def __getstate__(self):
+        # Handed from a pipeline worker to the parent: the spool goes by path
+        if self._spool is not None:
+            self._spool.flush()
+        state = dict(self.__dict__)
+        state['_spool'] = None
+        return state
+
+    def add(self, road: Dict):
+        coords = road['coords']
+        lats = [c[0] for c in coords]
+        lons = [c[1] for c in coords]
+        x0, y0 = lonlat_to_tile(min(lons), max(lats), self.zoom)
+        x1, y1 = lonlat_to_tile(max(lons), min(lats), self.zoom)
+
+        if self._spool is None:
+            fd, self._spool_path = tempfile.mkstemp(prefix='tiles_', suffix='.jsonl', dir=CONFIG['stream_dir'])
+            self._spool = os.fdopen(fd, 'wb')
+        number = len(self._offsets) - 1
+        self._spool.write(json.dumps(road, separators=(',', ':')).encode('utf-8'))
+        self._offsets.append(self._spool.tell())
+
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                if (x0 == x1 and y0 == y1) or way_intersects_bbox(coords, tile_bbox(self.zoom, x, y)):
+                    self._tiles.setdefault((x, y), array('I')).append(number)
+
+    def _read_roads(self, spool, numbers: Iterable[int]) -> List[Dict]:
+        roads = []
+        for number in numbers:
+            spool.seek(self._offsets[number])
+            roads.append(json.loads(spool.read(self._offsets[number + 1] - self._offsets[number])))
+        return roads
+
+    def _merge_tile(self, path: str, x: int, y: int, jurisdiction_id: str, roads: List[Dict]) -> int:
+        if os.path.exists(path):
+            with open(path) as f:
+                tile = json.load(f)
+        else:
+            tile = {'z': self.zoom, 'x': x, 'y': y, 'jurisdictions': {}, 'roads': []}
+
+        by_id = {road['id']: road for road in tile['roads']}
+        by_id.update((road['id'], road) for road in roads)
+        if roads:
+            tile['jurisdictions'][jurisdiction_id] = sorted({road['id'] for road in roads})
+        else:
+            tile['jurisdictions'].pop(jurisdiction_id, None)
+
+        referenced = {rid for ids in tile['jurisdictions'].values() for rid in ids}
+        tile['roads'] = [by_id[rid] for rid in sorted(referenced)]
+
+        if not tile['roads']:
+            if os.path.exists(path):
+                os.remove(path)
+            return 0
+
+        write_json_atomic(path, tile, separators=(',', ':'))
+        return os.path.getsize(path)
+
+    @timed('tiles')
+    def write(self, jurisdiction_id: str, output_dir: str) -> Dict:
+        """Merge this jurisdiction's roads into the shared tiles and write its tile index."""
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        if self._spool_path is None:
+            return self._write(None, jurisdiction_id, output_dir)  # no roads: only stale tiles to clear
+        try:
+            with open(self._spool_path, 'rb') as spool:
+                return self._write(spool, jurisdiction_id, output_dir)
+        finally:
+            os.remove(self._spool_path)
+            self._spool_path = None
+
+    def _write(self, spool, jurisdiction_id: str, output_dir: str) -> Dict:
+        index_path = os.path.join(output_dir, 'roads', f'{jurisdiction_id}.tiles.json')
+
+        # Tiles this jurisdiction used last time but no longer touches
+        stale = set()
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                previous = json.load(f)
+            if previous.get('zoom') == self.zoom:
+                stale = {tuple(t['key'].split('/')[1:]) for t in previous['tiles']}
+                stale = {(int(x), int(y)) for x, y in stale} - set(self._tiles)
+
+        entries = []
+        for (x, y) in sorted(self._tiles) + sorted(stale):
+            key = f'{self.zoom}/{x}/{y}'
+            rel_path = f'tiles/{key}.json'
+            path = os.path.join(output_dir, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            roads = self._read_roads(spool, self._tiles.get((x, y), ()))
+            if not roads and not os.path.exists(path):
+                continue  # stale tile already deleted (e.g. by a run killed before its index was rewritten)
+            with _tile_lock(key):
+                size = self._merge_tile(path, x, y, jurisdiction_id, roads)
+            _metrics.count('bytesWritten', size)
+
+            if roads:
+                entries.append({
+                    'key': key,
+                    'file': rel_path,
+                    'bytes': size,
+                    'bbox': [round(v, 6) for v in tile_bbox(self.zoom, x, y)],
+                    'roads': sorted({road['id'] for road in roads})
+                })
+
+        write_json_atomic(index_path, {'jurisdiction': jurisdiction_id, 'zoom': self.zoom, 'tiles': entries},
+                          separators=(',', ':'))
+
+        print(f"    Saved {len(entries)} z{self.zoom} tiles")
+        return {'index': f'roads/{jurisdiction_id}.tiles.json', 'zoom': self.zoom, 'count': len(entries)}
+
+
+class ContentHasher:
+    """Hash of a jurisdiction's road records, used to detect unchanged output."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.way_count = 0
+
+    def add(self, road: Dict):
+        self._hash.update(json.dumps(road, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+        self.way_count += len(road.get('wayIds', ())) or 1
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+# ============================================================
+# STATEWIDE INDEXES
+# ============================================================
+_SEARCH_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def road_search_tokens(road: Dict) -> set:
+    """
+    Lowercase name and ref tokens of a road, as matched by the search index.
+
+    Refs are also indexed without separators ("I 95" gives "i", "95" and
+    "i95"). Generated "Unnamed <highway>" names are not indexed.
+    """
+    name = road['name'] if road['name'] != f"Unnamed {road['highway']}" else ''
+    ref = road.get('ref', '').lower()
+    tokens = set(_SEARCH_TOKEN.findall(name.lower()))
+    for part in ref.split(';'):  # OSM separates multiple refs with ';'
+        words = _SEARCH_TOKEN.findall(part)
+        tokens.update(words)
+        if len(words) > 1:
+            tokens.add(''.join(words))
+    return {t for t in tokens if len(t) >= CONFIG['search_min_token_length'] or t.isdigit()}
+
+
+class RoadIndexBuilder:
+    """
+    Search tokens and functional-class mileage of one jurisdiction's roads.
+
+    Written next to the road file as roads/<id>.index.json, so
+    build_statewide_indexes can merge every jurisdiction without loading
+    any road files (including jurisdictions skipped as unchanged).
+    """
+
+    def __init__(self):
+        self.tokens = {}
+        self.fc = {fc: {'roads': 0, 'miles': 0.0} for fc in ('1', '2', '3', '4', '5', '6', '7')}
+
+    def add(self, road: Dict):
+        for token in road_search_tokens(road):
+            self.tokens.setdefault(token, []).append(road['id'])
+        fc = self.fc[road['funcClass']]
+        fc['roads'] += 1
+        fc['miles'] += road['length']
+
+    def fc_mileage(self) -> Dict:
+        return {fc: {'roads': v['roads'], 'miles': round(v['miles'], 2)} for fc, v in self.fc.items()}
+
+    @timed('index')
+    def write(self, jurisdiction_id: str, output_dir: str) -> str:
+        """Write roads/<id>.index.json and return its path relative to ``output_dir``."""
+        rel_path = f'roads/{jurisdiction_id}.index.json'
+        write_json_atomic(os.path.join(output_dir, rel_path), {
+            'jurisdiction': jurisdiction_id,
+            'fcMileage': self.fc_mileage(),
+            'tokens': {token: sorted(ids) for token, ids in sorted(self.tokens.items())}
+        }, separators=(',', ':'))
+        return rel_path
+
+
+def _load_road_index(jurisdiction_id: str, output_dir: str) -> Optional[Dict]:
+    """A jurisdiction's roads/<id>.index.json, built from its road file if it predates indexes."""
+    path = os.path.join(output_dir, 'roads', f'{jurisdiction_id}.index.json')
+    if not os.path.exists(path):
+        roads_path = os.path.join(output_dir, 'roads', f'{jurisdiction_id}.json')
+        if not os.path.exists(roads_path):
+            return None
+        with open(roads_path) as f:
+            roads = json.load(f)['roads']
+        builder = RoadIndexBuilder()
+        for road in roads:
+            builder.add(road)
+        builder.write(jurisdiction_id, output_dir)
+
+    with open(path) as f:
+        return json.load(f)
+
+
+@timed('index')
+def build_statewide_indexes(output_dir: str) -> Dict:
+    """
+    Merge the per-jurisdiction indexes into statewide files referenced from manifest.json.
+
+    search_index.json maps each token to a flat list of
+    ``[jurisdiction position, road id, ...]`` pairs, positions referring
+    to its ``jurisdictions`` list. fc_mileage.json holds road counts and
+    miles per functional class for each jurisdiction and the state.
+    Both cover every available jurisdiction in the manifest, not just the
+    ones this run generated. Returns the manifest's ``indexes`` field.
+    """
+    manifest = open_manifest(output_dir)
+    available = manifest.available()
+
+    jurisdictions = []
+    tokens = {}
+    mileage = {}
+    statewide = {fc: {'roads': 0, 'miles': 0.0} for fc in ('1', '2', '3', '4', '5', '6', '7')}
+    for j_id in available:
+        index = _load_road_index(j_id, output_dir)
+        if index is None:
+            continue
+        position = len(jurisdictions)
+        jurisdictions.append(j_id)
+        for token, ids in index['tokens'].items():
+            postings = tokens.setdefault(token, [])
+            for road_id in ids:
+                postings += (position, road_id)
+        mileage[j_id] = index['fcMileage']
+        for fc, v in index['fcMileage'].items():
+            statewide[fc]['roads'] += v['roads']
+            statewide[fc]['miles'] += v['miles']
+
+    generated = datetime.utcnow().isoformat() + 'Z'
+    search_path = os.path.join(output_dir, 'search_index.json')
+    write_json_atomic(search_path, {
+        'generated': generated,
+        'jurisdictions': jurisdictions,
+        'tokens': dict(sorted(tokens.items()))
+    }, separators=(',', ':'))
+
+    mileage_path = os.path.join(output_dir, 'fc_mileage.json')
+    write_json_atomic(mileage_path, {
+        'generated': generated,
+        'statewide': {fc: {'roads': v['roads'], 'miles': round(v['miles'], 2)} for fc, v in statewide.items()},
+        'jurisdictions': mileage
+    }, separators=(',', ':'))
+    _metrics.count('bytesWritten', os.path.getsize(search_path) + os.path.getsize(mileage_path))
+
+    indexes = {
+        'search': {'file': 'search_index.json', 'tokens': len(tokens),
+                   'bytes': os.path.getsize(search_path)},
+        'fcMileage': {'file': 'fc_mileage.json', 'bytes': os.path.getsize(mileage_path)},
+        'jurisdictions': len(jurisdictions),
+        'generated': generated
+    }
+    manifest.set_field('indexes', indexes)
+
+    print(f"Statewide indexes: {len(tokens)} search tokens, FC mileage for "
+          f"{len(jurisdictions)} jurisdiction(s)")
+    return indexes
+
+
+def _feed_sink(pairs: Iterable[tuple], sink):
+    """Pass (road, length) pairs through, handing each road to ``sink`` on the way."""
+    for road, length in pairs:
+        sink.add(road)
+        yield road, length
+
+
+def save_jurisdiction_outputs(elements: Iterable[Dict], jurisdiction_id: str, output_dir: str,
+                              stream: bool = None, previous_hash: str = None,
+                              pairs: Iterable[tuple] = None, defer_tiles: bool = False) -> tuple:
+    """
+    Process way elements and write every output file for one jurisdiction.
+
+    Always writes roads/<id>.json, plus roads/<id>.bin when
+    ``CONFIG['write_binary']`` is set, one simplified file per
+    ``CONFIG['lod_levels']`` zoom and the jurisdiction's share of the
+    statewide tiles when ``CONFIG['write_tiles']`` is set, and the
+    jurisdiction's search/mileage index when ``CONFIG['write_indexes']``
+    is set. Returns
+    (summary, manifest extras).
+
+    Without streaming, nothing is written when the roads hash to
+    ``previous_hash``; the extras are then None. ``pairs`` of already
+    built (road, length) can be passed instead of ``elements``. With
+    ``defer_tiles`` the extras hold the unwritten TileBuilder under
+    ``tiles`` for record_outputs to merge (tiles are shared between
+    jurisdictions, so pipeline worker processes leave them to the parent).
+
+    With ``CONFIG['merge_segments']`` ways continuing each other are
+    joined by merge_road_segments (spooled to disk when streaming). Tiles
+    still get the individual ways, since they are shared with neighbouring
+    jurisdictions that may merge differently and are deduplicated by way
+    id. The extras' ``wayCount`` counts OSM ways, the summary's
+    ``roadCount`` the roads written.
+    """
+    if stream is None:
+        stream = CONFIG['streaming']
+    if pairs is None:
+        pairs = iter_roads(elements)
+
+    files = {'json': f'roads/{jurisdiction_id}.json'}
+    hasher = ContentHasher()
+    lod = LodBuilder() if CONFIG['lod_levels'] else None
+    tiles = TileBuilder() if CONFIG['write_tiles'] else None
+    index = RoadIndexBuilder() if CONFIG['write_indexes'] else None
+
+    if stream:
+        binary = RoadBinaryWriter() if CONFIG['write_binary'] else None
+        sinks = [sink for sink in (hasher, binary, lod, index) if sink is not None]
+        if CONFIG['merge_segments']:
+            # Tiles take the individual ways on their way into the merge
+            if tiles:
+                pairs = _feed_sink(pairs, tiles)
+            pairs = merge_road_segments(pairs, spool=True)
+        elif tiles:
+            sinks.append(tiles)
+        summary = write_road_data_stream(pairs, jurisdiction_id, output_dir, sinks=sinks)
+        if binary:
+            file_path = os.path.join(output_dir, 'roads', f'{jurisdiction_id}.bin')
+            size = binary.write(file_path, summary)
+            print(f"    Saved to {file_path} ({size / 1024:.0f} KB)")
+    else:
+        ways = list(pairs)
+        merged = merge_road_segments(ways) if CONFIG['merge_segments'] else ways
+        summary = process_road_data(None, jurisdiction_id, merged)
+        for road in summary['roads']:
+            hasher.add(road)
+        if previous_hash and hasher.hexdigest() == previous_hash:
+            return summary, None
+
+        save_road_data(summary, jurisdiction_id, output_dir)
+        if CONFIG['write_binary']:
+            write_road_binary(summary, jurisdiction_id, output_dir)
+        for sink in (lod, index):
+            if sink is not None:
+                for road in summary['roads']:
+                    sink.add(road)
+        if tiles:
+            for road, _ in ways:
+                tiles.add(road)
+
+    if CONFIG['write_binary']:
+        files['binary'] = f'roads/{jurisdiction_id}.bin'
+    if index:
+        files['index'] = index.write(jurisdiction_id, output_dir)
+
+    extra = {'files': files, 'contentHash': hasher.hexdigest(), 'wayCount': hasher.way_count}
+    if index:
+        extra['fcMileage'] = index.fc_mileage()
+    if lod:
+        extra['lod'] = lod.write(jurisdiction_id, output_dir, summary)
+    if tiles:
+        extra['tiles'] = tiles if defer_tiles else tiles.write(jurisdiction_id, output_dir)
+
+    return summary, extra
+
+
+# ============================================================
+# MANIFEST AND RUN JOURNAL
+# ============================================================
+class Manifest:
+    """
+    manifest.json held in memory for a run, backed by a crash-safe journal.
+
+    Every finished jurisdiction is appended to the journal (one fsynced
+    JSON line holding its complete manifest entry) before it is merged
+    in memory. manifest.json itself is only rewritten, atomically, every
+    ``manifest_flush_every`` jurisdictions and on flush(). A journal left
+    behind by a killed run is replayed on open, and completed() tells the
+    next run which jurisdictions it can skip.
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, 'manifest.json')
+        self.journal_path = os.path.join(output_dir, CONFIG['journal_file'])
+        self._lock = threading.Lock()
+        self._journal = None
+        self._completed = set()
+        self._pending = 0
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {
+                'generated': '',
+                'version': '1.0',
+                'jurisdictions': {}
+            }
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn last line from the crash
+                    self.data['jurisdictions'][record['jurisdiction']] = record['entry']
+                    self._completed.add(record['jurisdiction'])
+            self._pending = len(self._completed)
+
+    def entry(self, jurisdiction_id: str) -> Optional[Dict]:
+        """A copy of the jurisdiction's entry, or None."""
+        with self._lock:
+            entry = self.data['jurisdictions'].get(jurisdiction_id)
+            return dict(entry) if entry is not None else None
+
+    def available(self) -> List[str]:
+        """Sorted ids of the jurisdictions that have generated data."""
+        with self._lock:
+            return sorted(j_id for j_id, entry in self.data['jurisdictions'].items() if entry.get('available'))
+
+    def completed(self) -> set:
+        """Jurisdictions recorded in the journal (i.e. finished by an unfinished run)."""
+        with self._lock:
+            return set(self._completed)
+
+    def record(self, jurisdiction_id: str, entry: Dict):
+        """Journal a finished jurisdiction and merge its entry, flushing at checkpoints."""
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a')
+            self._journal.write(json.dumps({'jurisdiction': jurisdiction_id, 'entry': entry}) + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+            self.data['jurisdictions'][jurisdiction_id] = entry
+            self.data['generated'] = datetime.utcnow().isoformat() + 'Z'
+            self._completed.add(jurisdiction_id)
+            self._pending += 1
+            if self._pending >= CONFIG['manifest_flush_every']:
+                self._flush()
+
+    def set_field(self, key: str, value: Any):
+        """Set a top-level manifest field (written at the next checkpoint)."""
+        with self._lock:
+            self.data[key] = value
+            self._pending += 1
+
+    def _flush(self):
+        if self._pending:
+            write_json_atomic(self.path, self.data, indent=2)
+            self._pending = 0
+
+    def flush(self):
+        """Write manifest.json now if anything changed since the last checkpoint."""
+        with self._lock:
+            self._flush()
+
+    def finish(self):
+        """Flush and drop the journal: the run is complete, the next one starts fresh."""
+        with self._lock:
+            self._flush()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._completed.clear()
+
+
+_manifests: Dict[str, Manifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def open_manifest(output_dir: str) -> Manifest:
+    """The process-wide Manifest for ``output_dir``, loading (and replaying) it on first use."""
+    key = os.path.abspath(output_dir)
+    with _manifests_lock:
+        if key not in _manifests:
+            _manifests[key] = Manifest(output_dir)
+        return _manifests[key]
+
+
+def flush_manifests():
+    """Write every open manifest to disk."""
+    with _manifests_lock:
+        manifests = list(_manifests.values())
+    for manifest in manifests:
+        manifest.flush()
+
+
+@timed('manifest')
+def update_manifest(jurisdiction_id: str, data: Dict, output_dir: str, extra: Dict = None):
+    """Record a jurisdiction in the manifest. ``extra`` fields are added to its entry."""
+    entry = {
+        'available': True,
+        'lastUpdated': data['generated'],
+        'roadCount': data['roadCount'],
+        'totalMiles': data['totalMiles']
+    }
+    if extra:
+        entry.update(extra)
+
+    open_manifest(output_dir).record(jurisdiction_id, entry)
+
+
+def read_manifest_entry(jurisdiction_id: str, output_dir: str) -> Optional[Dict]:
+    """A jurisdiction's current manifest entry, or None."""
+    return open_manifest(output_dir).entry(jurisdiction_id)
+
+
+@timed('manifest')
+def touch_manifest(jurisdiction_id: str, output_dir: str, fields: Dict = None):
+    """Mark an unchanged jurisdiction as current: bump ``lastUpdated`` (plus ``fields``)."""
+    manifest = open_manifest(output_dir)
+    entry = manifest.entry(jurisdiction_id)
+    entry['lastUpdated'] = datetime.utcnow().isoformat() + 'Z'
+    entry.update(fields or {})
+    manifest.record(jurisdiction_id, entry)
+
+
+def generate_jurisdiction(jurisdiction_id: str, output_dir: str,
+                          scheduler: ServerScheduler = None, incremental: bool = False) -> bool:
+    """
+    Fetch, process and save one jurisdiction. Returns True on success.
+
+    With ``CONFIG['streaming']`` the response is parsed and written road by
+    road, so memory use does not grow with the size of the jurisdiction.
+
+    With ``incremental`` a jurisdiction generated before is first probed
+    for edits since its ``osmBase``; if nothing changed only its
+    ``lastUpdated`` is bumped. If the full download yields identical roads,
+    the files are left alone as well.
+    """
+    return generate_jurisdiction_batch([[jurisdiction_id]], output_dir, scheduler, incremental)[jurisdiction_id]
+
+
+def has_previous_output(jurisdiction_id: str, output_dir: str, previous: Dict = None) -> bool:
+    """Whether an earlier run generated this jurisdiction (``previous`` is its manifest entry)."""
+    if previous is None:
+        previous = read_manifest_entry(jurisdiction_id, output_dir)
+    return bool(previous and previous.get('available') and previous.get('osmBase')
+                and os.path.exists(os.path.join(output_dir, 'roads', f'{jurisdiction_id}.json')))
+
+
+def check_unchanged(jurisdiction_id: str, output_dir: str, scheduler: ServerScheduler) -> tuple:
+    """
+    Incremental pre-check for one jurisdiction: (unchanged, previous contentHash, stale).
+
+    An unchanged jurisdiction has its manifest entry touched here.
+    ``stale`` means earlier output exists but the probe found edits (or
+    could not tell), so the download must not come from the response
+    cache, which may still hold the response that output was built from.
+    Offline there is no probe: the cached response is used if there is
+    one, otherwise fetch_batch keeps the earlier output.
+    """
+    previous = read_manifest_entry(jurisdiction_id, output_dir)
+    if not has_previous_output(jurisdiction_id, output_dir, previous):
+        return False, None, False
+
+    if CONFIG['cache_mode'] == 'offline':
+        return False, previous.get('contentHash'), False
+
+    if probe_jurisdiction_changed(jurisdiction_id, previous, scheduler) is False:
+        touch_manifest(jurisdiction_id, output_dir)
+        print(f"    [{jurisdiction_id}] UNCHANGED")
+        return True, None, False
+    return False, previous.get('contentHash'), True
+
+
+def record_outputs(jurisdiction_id: str, output_dir: str, processed_data: Dict,
+                   extra: Optional[Dict], osm_base: Optional[str]):
+    """Record what save_jurisdiction_outputs did in the manifest."""
+    with _metrics.scope(jurisdiction_id):
+        _record_outputs(jurisdiction_id, output_dir, processed_data, extra, osm_base)
+
+
+def _record_outputs(jurisdiction_id: str, output_dir: str, processed_data: Dict,
+                    extra: Optional[Dict], osm_base: Optional[str]):
+    if extra is None:
+        touch_manifest(jurisdiction_id, output_dir, {'osmBase': osm_base} if osm_base else None)
+        print(f"    [{jurisdiction_id}] UNCHANGED (same content)")
+        return
+
+    print(f"    [{jurisdiction_id}] Processed {processed_data['roadCount']} roads "
+          f"({processed_data['totalMiles']} miles)")
+    _metrics.count('roads', processed_data['roadCount'])
+
+    if isinstance(extra.get('tiles'), TileBuilder):
+        extra['tiles'] = extra['tiles'].write(jurisdiction_id, output_dir)
+
+    # Update manifest
+    if osm_base:
+        extra['osmBase'] = osm_base
+    update_manifest(jurisdiction_id, processed_data, output_dir, extra)
+
+    print(f"    [{jurisdiction_id}] SUCCESS")
+
+
+def _bbox_area(bbox: List[float]) -> float:
+    return max(0.0, bbox[2] - bbox[0]) * max(0.0, bbox[3] - bbox[1])
+
+
+def plan_shared_fetches(jurisdiction_ids: List[str], min_overlap: float = None) -> List[List[str]]:
+    """
+    Group jurisdictions whose bboxes overlap heavily so each group is fetched once.
+
+    A jurisdiction joins the group of a larger one whose bbox covers at
+    least ``min_overlap`` (default ``CONFIG['shared_fetch_min_overlap']``)
+    of its own bbox, e.g. an independent city inside its county; ties go
+    to the smaller host. Returns groups host first, in input order;
+    jurisdictions that fit nowhere form groups of one.
+    """
+    if min_overlap is None:
+        min_overlap = CONFIG['shared_fetch_min_overlap']
+
+    bboxes = {j_id: JURISDICTIONS[j_id]['bbox'] for j_id in jurisdiction_ids}
+    hosts = {}
+    for j_id in sorted(jurisdiction_ids, key=lambda j: -_bbox_area(bboxes[j])):
+        bbox = bboxes[j_id]
+        area = _bbox_area(bbox)
+        best = None
+        for host in hosts:
+            h = bboxes[host]
+            overlap = _bbox_area([max(bbox[0], h[0]), max(bbox[1], h[1]),
+                                  min(bbox[2], h[2]), min(bbox[3], h[3])])
+            if area and overlap / area >= min_overlap:
+                rank = (-overlap, _bbox_area(h))
+                if best is None or rank < best[0]:
+                    best = (rank, host)
+        if best:
+            hosts[best[1]].append(j_id)
+        else:
+            hosts[j_id] = [j_id]
+
+    return [hosts[j_id] for j_id in jurisdiction_ids if j_id in hosts]
+
+
+def estimate_way_count(jurisdiction_id: str, output_dir: str) -> int:
+    """Ways a jurisdiction's query returns: last run's ``wayCount``, else a guess from its bbox area."""
+    entry = read_manifest_entry(jurisdiction_id, output_dir)
+    if entry and entry.get('wayCount') is not None:
+        return entry['wayCount']
+    return int(_bbox_area(JURISDICTIONS[jurisdiction_id]['bbox']) * CONFIG['batch_ways_per_sq_degree'])
+
+
+def plan_query_batches(groups: List[List[str]], output_dir: str) -> List[List[List[str]]]:
+    """
+    Pack small, nearby fetch groups into batches fetched with one combined query.
+
+    Batches are seeded from the smallest unbatched group estimated below
+    ``batch_max_ways`` and take the nearest other small groups (bbox
+    centres at most ``batch_max_distance`` degrees apart) while the
+    estimated total stays within ``batch_max_ways`` and the batch has at
+    most ``batch_max_jurisdictions``. Larger groups get a batch of their
+    own. Batches keep the order of their first group.
+    """
+    def center(group):
+        west, south, east, north = union_bbox(JURISDICTIONS[j_id]['bbox'] for j_id in group)
+        return (west + east) / 2, (south + north) / 2
+
+    estimates = [sum(estimate_way_count(j_id, output_dir) for j_id in group) for group in groups]
+    small = {i for i, estimate in enumerate(estimates) if estimate < CONFIG['batch_max_ways']}
+    centers = [center(group) for group in groups]
+
+    batches = []
+    batched = set()
+    for i in sorted(range(len(groups)), key=lambda i: estimates[i]):
+        if i in batched:
+            continue
+        batch = [i]
+        batched.add(i)
+        if i in small:
+            total = estimates[i]
+            size = len(groups[i])
+            cx, cy = centers[i]
+            nearby = sorted((math.hypot(centers[k][0] - cx, centers[k][1] - cy), k) for k in small - batched)
+            for distance, k in nearby:
+                if distance > CONFIG['batch_max_distance']:
+                    break
+                if total + estimates[k] > CONFIG['batch_max_ways'] \
+                        or size + len(groups[k]) > CONFIG['batch_max_jurisdictions']:
+                    continue
+                batch.append(k)
+                batched.add(k)
+                total += estimates[k]
+                size += len(groups[k])
+        batches.append(sorted(batch))
+
+    return [[groups[k] for k in batch] for batch in sorted(batches)]
+
+
+def fetch_batch(batch: List[List[str]], output_dir: str,
+                scheduler: ServerScheduler = None, incremental: bool = False) -> Dict:
+    """
+    Fetch stage for one batch (see generate_jurisdiction_batch).
+
+    Returns a dict with ``results`` for jurisdictions settled without
+    building (unchanged, or the fetch failed), the ``members`` still to
+    build with their ``previous_hashes``, and the ``osm_data`` response
+    (None when there is nothing to build).
+    """
+    if scheduler is None:
+        scheduler = ServerScheduler(CONFIG['overpass_servers'], min_request_interval=0)
+
+    stream = CONFIG['streaming']
+    group_of = {j_id: i for i, group in enumerate(batch) for j_id in group}
+    label = '+'.join(group_of)
+    fetched = {'results': {}, 'members': [], 'previous_hashes': {}, 'osm_data': None}
+    refresh = False
+
+    for j_id in group_of:
+        if incremental:
+            unchanged, fetched['previous_hashes'][j_id], stale = check_unchanged(j_id, output_dir, scheduler)
+            refresh = refresh or stale
+            if unchanged:
+                fetched['results'][j_id] = True
+                continue
+        fetched['members'].append(j_id)
+    members = fetched['members']
+    if not members:
+        return fetched
+
+    if len(group_of) == 1:
+        osm_data = fetch_road_data(label, scheduler=scheduler, stream=stream, refresh=refresh)
+    else:
+        fetch_boxes = [
+            union_bbox(JURISDICTIONS[j_id]['bbox'] for j_id in members if group_of[j_id] == i)
+            for i in sorted({group_of[j_id] for j_id in members})
+        ]
+        print(f"    [{label}] One query for {len(members)} jurisdictions ({len(fetch_boxes)} bbox clauses)")
+        osm_data = fetch_bboxes(fetch_boxes, scheduler, label, stream=stream, refresh=refresh)
+
+    if not osm_data and incremental and CONFIG['cache_mode'] == 'offline':
+        # Nothing cached: leave what earlier runs generated as it is
+        for j_id in [j_id for j_id in members if has_previous_output(j_id, output_dir)]:
+            print(f"    [{j_id}] Keeping previous output (offline)")
+            fetched['results'][j_id] = True
+            members.remove(j_id)
+        if not members:
+            return fetched
+
+    if not osm_data:
+        print(f"    [{label}] FAILED: Could not fetch data")
+        fetched['results'].update({j_id: False for j_id in members})
+        fetched['members'] = []
+        return fetched
+
+    if not stream:
+        print(f"    [{label}] Received {len(osm_data.get('elements', []))} elements")
+    fetched['osm_data'] = osm_data
+    return fetched
+
+
+def build_batch_outputs(members: List[str], osm_data: Dict, output_dir: str,
+                        previous_hashes: Dict[str, str] = None, defer_tiles: bool = False) -> List[tuple]:
+    """
+    Process stage: build roads from a fetched batch and write each member's files.
+
+    A single jurisdiction gets every way in the response. With several,
+    every way is turned into a road (length included) once and handed to
+    each member whose bbox its geometry intersects. Returns (id, summary
+    without roads, manifest extras, osmBase) per member for record_outputs,
+    and deletes streamed response files.
+    """
+    stream = CONFIG['streaming']
+    previous_hashes = previous_hashes or {}
+    outputs = []
+
+    def add_output(j_id, summary, extra):
+        outputs.append((j_id, {k: v for k, v in summary.items() if k != 'roads'}, extra, osm_base))
+
+    try:
+        osm_base = response_osm_base(osm_data)
+        if len(members) == 1:
+            j_id = members[0]
+            with _metrics.scope(j_id):
+                add_output(j_id, *save_jurisdiction_outputs(
+                    iter_response_elements(osm_data), j_id, output_dir, stream=stream,
+                    previous_hash=previous_hashes.get(j_id), defer_tiles=defer_tiles))
+            return outputs
+
+        label = '+'.join(members)
+        bboxes = {j_id: JURISDICTIONS[j_id]['bbox'] for j_id in members}
+        index = BBoxIndex(bboxes)
+        way_count = 0
+        with tempfile.TemporaryDirectory(prefix='road_shared_', dir=CONFIG['stream_dir']) as spool_dir:
+            # Streaming keeps each member's roads in a spool file instead of memory
+            assigned = {j_id: open(os.path.join(spool_dir, f'{j_id}.jsonl'), 'w') if stream else []
+                        for j_id in members}
+            try:
+                for road, length in iter_roads(iter_response_elements(osm_data)):
+                    way_count += 1
+                    for j_id in index.intersecting(road['coords']):
+                        if stream:
+                            assigned[j_id].write(json.dumps([road, length]) + '\n')
+                        else:
+                            assigned[j_id].append((road, length))
+            finally:
+                if stream:
+                    for f in assigned.values():
+                        f.close()
+            print(f"    [{label}] Built {way_count} roads once for {len(members)} jurisdictions")
+
+            for j_id in members:
+                with _metrics.scope(j_id):
+                    if stream:
+                        with open(os.path.join(spool_dir, f'{j_id}.jsonl')) as f:
+                            add_output(j_id, *save_jurisdiction_outputs(
+                                None, j_id, output_dir, stream=True, defer_tiles=defer_tiles,
+                                pairs=(tuple(json.loads(line)) for line in f)))
+                    else:
+                        add_output(j_id, *save_jurisdiction_outputs(
+                            None, j_id, output_dir, stream=False, defer_tiles=defer_tiles,
+                            previous_hash=previous_hashes.get(j_id), pairs=assigned.pop(j_id)))
+    finally:
+        discard_response(osm_data)
+
+    return outputs
+
+
+def _build_batch_worker(config: Dict, members: List[str], osm_data: Dict, output_dir: str,
+                        previous_hashes: Dict[str, str]) -> tuple:
+    """
+    build_batch_outputs in a pipeline worker process, under the parent's CONFIG.
+
+    Returns (outputs, metrics recorded in this process).
+    """
+    CONFIG.update(config)
+    start_metrics()
+    with _metrics.scope('+'.join(members)), profiled('build'):
+        outputs = build_batch_outputs(members, osm_data, output_dir, previous_hashes, defer_tiles=True)
+    return outputs, _metrics.drain()
+
+
+def generate_jurisdiction_batch(batch: List[List[str]], output_dir: str,
+                                scheduler: ServerScheduler = None,
+                                incremental: bool = False) -> Dict[str, bool]:
+    """
+    Fetch one batch of groups and save each jurisdiction in it. Returns {id: success}.
+
+    A batch is a list of plan_shared_fetches groups. The whole batch is
+    downloaded with one query holding the union bbox of each group, then
+    split up by build_batch_outputs.
+    """
+    j_ids = [j_id for group in batch for j_id in group]
+    with _metrics.scope('+'.join(j_ids), j_ids), profiled('fetch'):
+        fetched = fetch_batch(batch, output_dir, scheduler, incremental)
+    results = fetched['results']
+    if fetched['osm_data'] is not None:
+        with _metrics.scope('+'.join(fetched['members'])), profiled('build'):
+            outputs = build_batch_outputs(fetched['members'], fetched['osm_data'], output_dir,
+                                          fetched['previous_hashes'])
+        for j_id, summary, extra, osm_base in outputs:
+            record_outputs(j_id, output_dir, summary, extra, osm_base)
+            results[j_id] = True
+    return results
+
+
+def generate_batches_threaded(batches: List[List[List[str]]], output_dir: str, scheduler: ServerScheduler,
+                              max_workers: int, incremental: bool = False):
+    """Generate batches in ``max_workers`` threads, yielding (batch, {id: success}) as they finish."""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(generate_jurisdiction_batch, batch, output_dir, scheduler, incremental): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                j_ids = [j_id for group in batch for j_id in group]
+                print(f"    [{'+'.join(j_ids)}] FAILED: {e}")
+                results = {j_id: False for j_id in j_ids}
+            yield batch, results
+
+
+def run_pipeline(batches: List[List[List[str]]], output_dir: str, scheduler: ServerScheduler,
+                 fetch_workers: int, process_workers: int, incremental: bool = False):
+    """
+    Generate batches as a three-stage pipeline, yielding (batch, {id: success}) as they finish.
+
+    Fetch: ``fetch_workers`` threads download batches (network bound).
+    Build: ``process_workers`` processes build roads and write each
+    jurisdiction's own files (CPU bound).
+    Record: the calling thread merges shared tiles and updates the manifest.
+
+    At most ``pipeline_queue_size`` fetched batches wait for a free
+    process; when the queue is full fetch threads block, so the number of
+    responses held at once stays bounded while every stage keeps working.
+
+    If the process pool breaks (a worker killed, e.g. by the OOM killer),
+    the batches in it fail and the remaining ones are built in the
+    dispatching thread instead.
+    """
+    fetched_queue = queue.Queue(maxsize=CONFIG['pipeline_queue_size'])
+    built_queue = queue.Queue()
+    process_slots = threading.Semaphore(process_workers)
+
+    def fetch_one(batch):
+        j_ids = [j_id for group in batch for j_id in group]
+        try:
+            with _metrics.scope('+'.join(j_ids), j_ids), profiled('fetch'):
+                fetched = fetch_batch(batch, output_dir, scheduler, incremental)
+        except Exception as e:
+            print(f"    [{'+'.join(j for group in batch for j in group)}] FAILED: {e}")
+            fetched = {'results': {j_id: False for group in batch for j_id in group},
+                       'members': [], 'osm_data': None}
+        fetched_queue.put((batch, fetched))
+
+    def fetch_all():
+        with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+            for future in [pool.submit(fetch_one, batch) for batch in batches]:
+                future.result()
+        fetched_queue.put(None)
+
+    def build_here(fetched) -> Future:
+        future = Future()
+        try:
+            with _metrics.scope('+'.join(fetched['members'])), profiled('build'):
+                future.set_result((build_batch_outputs(fetched['members'], fetched['osm_data'], output_dir,
+                                                       fetched['previous_hashes'], defer_tiles=True), None))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def dispatch(procs):
+        broken = False
+        while True:
+            item = fetched_queue.get()
+            if item is None:
+                break
+            batch, fetched = item
+            if fetched['osm_data'] is None:
+                built_queue.put((batch, fetched, None))
+                continue
+
+            if not broken:
+                process_slots.acquire()
+                try:
+                    future = procs.submit(_build_batch_worker, dict(CONFIG), fetched['members'],
+                                          fetched['osm_data'], output_dir, fetched['previous_hashes'])
+                except Exception as e:
+                    process_slots.release()
+                    broken = True
+                    print(f"    Build processes unavailable ({type(e).__name__}), building in this process")
+                else:
+                    def done(future, batch=batch, fetched=fetched):
+                        process_slots.release()
+                        built_queue.put((batch, fetched, future))
+                    future.add_done_callback(done)
+                    continue
+
+            built_queue.put((batch, fetched, build_here(fetched)))
+
+    with ProcessPoolExecutor(max_workers=process_workers) as procs:
+        # Start the worker processes before any fetch thread exists
+        procs.submit(int).result()
+
+        fetcher = threading.Thread(target=fetch_all, daemon=True)
+        fetcher.start()
+        dispatcher = threading.Thread(target=dispatch, args=(procs,), daemon=True)
+        dispatcher.start()
+
+        for _ in batches:
+            batch, fetched, future = built_queue.get()
+            results = fetched['results']
+            if future is not None:
+                try:
+                    outputs, worker_metrics = future.result()
+                    if worker_metrics is not None:
+                        _metrics.merge(worker_metrics)
+                    for j_id, summary, extra, osm_base in outputs:
+                        record_outputs(j_id, output_dir, summary, extra, osm_base)
+                        results[j_id] = True
+                except Exception as e:
+                    print(f"    [{'+'.join(fetched['members'])}] FAILED: {type(e).__name__}: {e}")
+                    results.update({j_id: False for j_id in fetched['members'] if j_id not in results})
+                    discard_response(fetched['osm_data'])
+            yield batch, results
+
+        fetcher.join()
+        dispatcher.join()
+
+
+def generate_all_data(output_dir: str = 'data', jurisdictions: List[str] = None,
+                      max_workers: int = None, incremental: bool = False):
+    """
+    Main function to generate road data for all Virginia jurisdictions.
+
+    Args:
+        output_dir: Directory to save output files (default: 'data')
+        jurisdictions: List of specific jurisdiction IDs to process (default: all)
+        max_workers: Jurisdictions fetched concurrently across the Overpass
+            servers (default: CONFIG['max_workers']; 1 = one at a time with
+            ``delay_between_jurisdictions`` between them)
+        incremental: Skip jurisdictions whose roads have not changed since
+            the last run (see generate_jurisdiction)
+    """
+    print('=' * 50)
+    print('  CRASH LENS - Road Data Generator (Python/Colab)')
+    print('=' * 50)
+    print()
+
+    # Get jurisdictions to process
+    if jurisdictions is None or len(jurisdictions) == 0:
+        jurisdictions_to_process = list(JURISDICTIONS.keys())
+        print(f"Processing ALL {len(jurisdictions_to_process)} jurisdictions...")
+    else:
+        jurisdictions_to_process = jurisdictions
+        print(f"Processing {len(jurisdictions_to_process)} jurisdiction(s)...")
+    print()
+
+    # Create output directory
+    os.makedirs(output_dir, exist_ok=True)
+    open_response_cache(output_dir)
+    manifest = open_manifest(output_dir)
+    start_metrics()
+
+    success_count = 0
+    fail_count = 0
+    failed_jurisdictions = []
+
+    known = []
+    for i, j_id in enumerate(jurisdictions_to_process):
+        if j_id not in JURISDICTIONS:
+            print(f"[{i + 1}/{len(jurisdictions_to_process)}] SKIP: Unknown jurisdiction '{j_id}'")
+            fail_count += 1
+            failed_jurisdictions.append(j_id)
+        else:
+            known.append(j_id)
+
+    if CONFIG['resume']:
+        resumed = [j_id for j_id in known if j_id in manifest.completed()]
+        if resumed:
+            print(f"Resuming interrupted run: {len(resumed)} jurisdiction(s) already done")
+            print()
+            success_count += len(resumed)
+            known = [j_id for j_id in known if j_id not in resumed]
+
+    scheduler = ServerScheduler(CONFIG['overpass_servers'])
+    if max_workers is None:
+        max_workers = CONFIG['max_workers'] or scheduler.capacity
+
+    groups = plan_shared_fetches(known) if CONFIG['shared_fetch'] else [[j_id] for j_id in known]
+    shared = sum(len(group) for group in groups if len(group) > 1)
+    if shared:
+        print(f"Sharing fetches: {shared} overlapping jurisdictions in "
+              f"{sum(1 for group in groups if len(group) > 1)} groups")
+    batches = plan_query_batches(groups, output_dir) if CONFIG['batch_queries'] else [[g] for g in groups]
+    if len(batches) < len(groups):
+        print(f"Batching queries: {len(groups)} fetches packed into {len(batches)} requests")
+    if shared or len(batches) < len(groups):
+        print()
+
+    def batch_name(batch):
+        return ' + '.join(JURISDICTIONS[j_id]['name'] for group in batch for j_id in group)
+
+    if max_workers <= 1:
+        for i, batch in enumerate(batches):
+            print(f"[{i + 1}/{len(batches)}] {batch_name(batch)}")
+
+            for j_id, ok in generate_jurisdiction_batch(batch, output_dir, scheduler, incremental).items():
+                if ok:
+                    success_count += 1
+                else:
+                    fail_count += 1
+                    failed_jurisdictions.append(j_id)
+            print()
+
+            # Delay between jurisdictions to avoid rate limiting
+            if i < len(batches) - 1:
+                print(f"    Waiting {CONFIG['delay_between_jurisdictions']}s before next jurisdiction...")
+                print()
+                time.sleep(CONFIG['delay_between_jurisdictions'])
+    else:
+        print(f"Running {max_workers} workers across {len(scheduler.servers)} servers "
+              f"({scheduler.per_server_concurrency} per server, "
+              f"{scheduler.min_request_interval}s apart)")
+        print()
+
+        process_workers = CONFIG['process_workers']
+        if process_workers is None:
+            # One CPU stays with this process for fetching, tiles and the manifest
+            process_workers = min((os.cpu_count() or 1) - 1, CONFIG['max_process_workers'])
+        if process_workers > 0:
+            print(f"Pipeline: building in {process_workers} processes while fetching continues")
+            print()
+            finished = run_pipeline(batches, output_dir, scheduler, max_workers, process_workers, incremental)
+        else:
+            finished = generate_batches_threaded(batches, output_dir, scheduler, max_workers, incremental)
+
+        for done, (batch, results) in enumerate(finished, start=1):
+            for j_id, ok in results.items():
+                if ok:
+                    success_count += 1
+                else:
+                    fail_count += 1
+                    failed_jurisdictions.append(j_id)
+            print(f"[{done}/{len(batches)}] {batch_name(batch)} "
+                  f"{'done' if all(results.values()) else 'failed'}")
+
+    if CONFIG['write_indexes']:
+        print()
+        with _metrics.scope('statewide'):
+            build_statewide_indexes(output_dir)
+    manifest.finish()
+
+    print('=' * 50)
+    print(f"  COMPLETE: {success_count} success, {fail_count} failed")
+    if failed_jurisdictions:
+        print(f"  Failed: {', '.join(failed_jurisdictions)}")
+    write_metrics({j_id: j_id not in failed_jurisdictions for j_id in jurisdictions_to_process})
+    servers = scheduler.health.snapshot()
+    for server, st in servers.items():
+        print(f"  {server_name(server)}: {st['requests']} requests, {st['failures']} failed, "
+              f"avg {st['latency']}s{' (circuit open)' if st['circuitOpen'] else ''}")
+    print('=' * 50)
+
+    return {
+        'success': success_count,
+        'failed': fail_count,
+        'failed_jurisdictions': failed_jurisdictions,
+        'servers': servers
+    }
+
+
+# ============================================================
+# OFFLINE EXTRACT INGESTION
+# ============================================================
+
+class NodeIndex:
+    """
+    Compact array-backed node id -> coordinate index.
+
+    Coordinates are stored as 1e-7 degree fixed-point integers (OSM's own
+    precision) in parallel typed arrays, about 16 bytes per node instead of
+    a Python dict entry. Extracts list nodes in id order, so lookups are a
+    binary search; out-of-order input is sorted once before the first lookup.
+    """
+
+    SCALE = 10_000_000
+
+    def __init__(self):
+        self._ids = array('q')
+        self._lats = array('i')
+        self._lons = array('i')
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, node_id: int, lat: float, lon: float):
+        if self._ids and node_id < self._ids[-1]:
+            self._sorted = False
+        self._ids.append(node_id)
+        self._lats.append(round(lat * self.SCALE))
+        self._lons.append(round(lon * self.SCALE))
+
+    def _sort(self):
+        order = sorted(range(len(self._ids)), key=self._ids.__getitem__)
+        self._ids = array('q', (self._ids[i] for i in order))
+        self._lats = array('i', (self._lats[i] for i in order))
+        self._lons = array('i', (self._lons[i] for i in order))
+        self._sorted = True
+
+    def get(self, node_id: int) -> Optional[List[float]]:
+        """[lat, lon] of a node, or None if it is not in the index."""
+        if not self._sorted:
+            self._sort()
+        i = bisect_left(self._ids, node_id)
+        if i == len(self._ids) or self._ids[i] != node_id:
+            return None
+        return [self._lats[i] / self.SCALE, self._lons[i] / self.SCALE]
+
+
+def _open_extract(path: str):
+    """Open an extract, transparently decompressing .gz/.bz2 files."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _overlaps_bounds(coords: List[List[float]], bounds: Optional[List[float]]) -> bool:
+    """True if the bounding box of ``coords`` overlaps ``bounds`` ([west, south, east, north])."""
+    if bounds is None:
+        return True
+    lats = [c[0] for c in coords]
+    lons = [c[1] for c in coords]
+    return min(lons) <= bounds[2] and max(lons) >= bounds[0] and \
+        min(lats) <= bounds[3] and max(lats) >= bounds[1]
+
+
+def _xml_highway_node_ids(path: str, highway_types: set) -> array:
+    """Sorted ids of every node referenced by a highway way in an OSM XML extract."""
+    node_ids = array('q')
+    with _open_extract(path) as f:
+        context = ElementTree.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end' or elem.tag not in ('node', 'way', 'relation'):
+                continue
+            if elem.tag == 'way' and any(t.get('k') == 'highway' and t.get('v') in highway_types
+                                         for t in elem.iter('tag')):
+                node_ids.extend(int(nd.get('ref')) for nd in elem.iter('nd'))
+            root.clear()
+    return sorted_unique(node_ids)
+
+
+def iter_osm_xml_ways(path: str, highway_types: Iterable[str] = None,
+                      bounds: List[float] = None):
+    """
+    Stream highway ways with resolved coordinates from an OSM XML extract.
+
+    Yields (way_id, node_ids, coords, tags) with coords as [[lat, lon], ...].
+    XML lists nodes before the ways using them, so the extract is read
+    twice: first for the node ids of highway ways, then to index just
+    those nodes and resolve every way in full. Ways whose bounding box
+    misses ``bounds`` ([west, south, east, north]) are skipped; ways
+    crossing its edge keep their complete geometry, as in an Overpass
+    bbox query.
+    """
+    highway_types = set(highway_types or HIGHWAY_TYPES)
+    wanted = _xml_highway_node_ids(path, highway_types)
+    nodes = NodeIndex()
+
+    with _open_extract(path) as f:
+        context = ElementTree.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+
+        for event, elem in context:
+            if event != 'end':
+                continue
+
+            if elem.tag == 'node':
+                node_id = int(elem.get('id'))
+                i = bisect_left(wanted, node_id)
+                if i < len(wanted) and wanted[i] == node_id:
+                    nodes.add(node_id, float(elem.get('lat')), float(elem.get('lon')))
+
+            elif elem.tag == 'way':
+                tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                if tags.get('highway') in highway_types:
+                    node_ids = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                    coords = [c for c in (nodes.get(n) for n in node_ids) if c is not None]
+                    if len(coords) >= 2 and _overlaps_bounds(coords, bounds):
+                        yield int(elem.get('id')), node_ids, coords, tags
+
+            elif elem.tag != 'relation':
+                continue
+
+            # Drop parsed elements so memory stays flat
+            root.clear()
+
+
+def iter_osm_pbf_ways(path: str, highway_types: Iterable[str] = None,
+                      bounds: List[float] = None):
+    """
+    Stream highway ways with resolved coordinates from an .osm.pbf extract.
+
+    Uses pyosmium, whose node location index (``CONFIG['pbf_node_index']``)
+    can be memory or file backed, so every node of a way is resolved. Same
+    output as iter_osm_xml_ways.
+    """
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError("Reading .osm.pbf extracts needs pyosmium: pip install osmium")
+
+    highway_types = set(highway_types or HIGHWAY_TYPES)
+
+    processor = osmium.FileProcessor(path) \
+        .with_locations(CONFIG['pbf_node_index']) \
+        .with_filter(osmium.filter.KeyFilter('highway'))
+
+    for obj in processor:
+        if not obj.is_way() or obj.tags.get('highway') not in highway_types:
+            continue
+
+        node_ids = []
+        coords = []
+        for n in obj.nodes:
+            node_ids.append(n.ref)
+            if n.location.valid():
+                coords.append([n.location.lat, n.location.lon])
+
+        if len(coords) >= 2 and _overlaps_bounds(coords, bounds):
+            yield obj.id, node_ids, coords, {t.k: t.v for t in obj.tags}
+
+
+def iter_extract_ways(path: str, highway_types: Iterable[str] = None,
+                      bounds: List[float] = None):
+    """Stream highway ways from a .osm.pbf or (optionally compressed) .osm extract."""
+    if path.endswith('.pbf'):
+        return iter_osm_pbf_ways(path, highway_types, bounds)
+    return iter_osm_xml_ways(path, highway_types, bounds)
+
+
+def _segment_intersects_bbox(a: List[float], b: List[float], bbox: List[float]) -> bool:
+    """Liang-Barsky test of a [lat, lon] segment against a [west, south, east, north] bbox."""
+    west, south, east, north = bbox
+    x0, y0, x1, y1 = a[1], a[0], b[1], b[0]
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = 0.0, 1.0
+
+    for p, q in ((-dx, x0 - west), (dx, east - x0), (-dy, y0 - south), (dy, north - y0)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+
+def way_intersects_bbox(coords: List[List[float]], bbox: List[float]) -> bool:
+    """True if any point or segment of a [[lat, lon], ...] polyline lies in the bbox."""
+    west, south, east, north = bbox
+    for lat, lon in coords:
+        if west <= lon <= east and south <= lat <= north:
+            return True
+    return any(_segment_intersects_bbox(coords[i], coords[i + 1], bbox)
+               for i in range(len(coords) - 1))
+
+
+class BBoxIndex:
+    """Uniform grid over jurisdiction bboxes for fast candidate lookup."""
+
+    def __init__(self, bboxes: Dict[str, List[float]], cell_size: float = 0.25):
+        self.bboxes = bboxes
+        self.cell_size = cell_size
+        self._cells = {}
+        for key, bbox in bboxes.items():
+            for cell in self._cells_for(bbox):
+                self._cells.setdefault(cell, []).append(key)
+
+    def _cells_for(self, bbox: List[float]):
+        west, south, east, north = bbox
+        for cx in range(math.floor(west / self.cell_size), math.floor(east / self.cell_size) + 1):
+            for cy in range(math.floor(south / self.cell_size), math.floor(north / self.cell_size) + 1):
+                yield cx, cy
+
+    def candidates(self, bbox: List[float]) -> set:
+        """Keys whose bbox may overlap the given bbox."""
+        found = set()
+        for cell in self._cells_for(bbox):
+            found.update(self._cells.get(cell, ()))
+        return found
+
+    def intersecting(self, coords: List[List[float]]) -> List[str]:
+        """Keys whose bbox intersects a [[lat, lon], ...] polyline."""
+        lats = [c[0] for c in coords]
+        lons = [c[1] for c in coords]
+        way_bbox = [min(lons), min(lats), max(lons), max(lats)]
+        return [key for key in self.candidates(way_bbox)
+                if way_intersects_bbox(coords, self.bboxes[key])]
+
+
+def generate_from_extract(extract_path: str, output_dir: str = 'data',
+                          jurisdictions: List[str] = None):
+    """
+    Generate road data from a local OSM extract instead of Overpass.
+
+    A .osm.pbf extract is read in a single pass; an .osm (.osm.gz, .osm.bz2)
+    extract in two (see iter_osm_xml_ways). Each highway way is spooled to every selected jurisdiction whose bbox it
+    intersects, then each jurisdiction is processed and saved exactly like an
+    Overpass response.
+
+    Args:
+        extract_path: Path to the OSM extract (e.g. virginia-latest.osm.pbf)
+        output_dir: Directory to save output files (default: 'data')
+        jurisdictions: List of specific jurisdiction IDs to process (default: all)
+    """
+    print('=' * 50)
+    print('  CRASH LENS - Road Data Generator (OSM extract)')
+    print('=' * 50)
+    print()
+
+    jurisdictions_to_process = jurisdictions or list(JURISDICTIONS.keys())
+    unknown = [j_id for j_id in jurisdictions_to_process if j_id not in JURISDICTIONS]
+    known = [j_id for j_id in jurisdictions_to_process if j_id in JURISDICTIONS]
+    for j_id in unknown:
+        print(f"SKIP: Unknown jurisdiction '{j_id}'")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = open_manifest(output_dir)
+    start_metrics()
+
+    success_count = 0
+    if CONFIG['resume']:
+        resumed = [j_id for j_id in known if j_id in manifest.completed()]
+        if resumed:
+            print(f"Resuming interrupted run: {len(resumed)} jurisdiction(s) already done")
+            success_count += len(resumed)
+            known = [j_id for j_id in known if j_id not in resumed]
+
+    bboxes = {j_id: JURISDICTIONS[j_id]['bbox'] for j_id in known}
+    index = BBoxIndex(bboxes)
+    bounds = union_bbox(bboxes.values()) if bboxes else None
+
+    print(f"Reading {extract_path} for {len(known)} jurisdiction(s)...")
+
+    failed_jurisdictions = list(unknown)
+    way_count = 0
+    started = time.time()
+
+    with tempfile.TemporaryDirectory(prefix='road_spool_') as spool_dir:
+        spools = {j_id: open(os.path.join(spool_dir, f'{j_id}.jsonl'), 'w') for j_id in known}
+        try:
+            for way_id, node_ids, coords, tags in iter_extract_ways(extract_path, bounds=bounds):
+                targets = index.intersecting(coords)
+                if not targets:
+                    continue
+
+                element = json.dumps({
+                    'type': 'way',
+                    'id': way_id,
+                    'nodes': node_ids,
+                    'geometry': [{'lat': lat, 'lon': lon} for lat, lon in coords],
+                    'tags': tags
+                })
+                for j_id in targets:
+                    spools[j_id].write(element + '\n')
+
+                way_count += 1
+                if way_count % 100000 == 0:
+                    print(f"    {way_count} ways read...")
+        finally:
+            for f in spools.values():
+                f.close()
+
+        print(f"Read {way_count} highway ways in {time.time() - started:.0f}s")
+        print()
+
+        for i, j_id in enumerate(known):
+            print(f"[{i + 1}/{len(known)}] {JURISDICTIONS[j_id]['name']}")
+
+            with _metrics.scope(j_id), profiled('build'):
+                with open(os.path.join(spool_dir, f'{j_id}.jsonl')) as f:
+                    processed_data, extra = save_jurisdiction_outputs(
+                        (json.loads(line) for line in f), j_id, output_dir)
+                print(f"    Processed {processed_data['roadCount']} roads ({processed_data['totalMiles']} miles)")
+                _metrics.count('roads', processed_data['roadCount'])
+                update_manifest(j_id, processed_data, output_dir, extra)
+            success_count += 1
+
+    if CONFIG['write_indexes']:
+        with _metrics.scope('statewide'):
+            build_statewide_indexes(output_dir)
+    manifest.finish()
+
+    print()
+    print('=' * 50)
+    print(f"  COMPLETE: {success_count} success, {len(failed_jurisdictions)} failed "
+          f"({time.time() - started:.0f}s)")
+    if failed_jurisdictions:
+        print(f"  Failed: {', '.join(failed_jurisdictions)}")
+    write_metrics({j_id: j_id not in failed_jurisdictions for j_id in jurisdictions_to_process})
+    print('=' * 50)
+
+    return {
+        'success': success_count,
+        'failed': len(failed_jurisdictions),
+        'failed_jurisdictions': failed_jurisdictions
+    }
+
+
+# ============================================================
+# GOOGLE COLAB SPECIFIC FUNCTIONS
+# ============================================================
+
+def download_as_zip(output_dir: str = 'data'):
+    """Create a zip file and trigger download in Colab."""
+    import shutil
+    from google.colab import files
+
+    zip_name = 'virginia_road_data'
+    flush_manifests()
+    shutil.make_archive(zip_name, 'zip', output_dir)
+    files.download(f'{zip_name}.zip')
+    print(f"Downloaded {zip_name}.zip")
+
+
+def list_jurisdictions():
+    """Print all available jurisdiction IDs."""
+    print("Counties (95):")
+    counties = [k for k, v in JURISDICTIONS.items() if v['type'] == 'county']
+    for i, c in enumerate(sorted(counties)):
+        print(f"  {c}", end='\t\t' if len(c) < 12 else '\t')
+        if (i + 1) % 4 == 0:
+            print()
+    print()
+
+    print("\nIndependent Cities (38):")
+    cities = [k for k, v in JURISDICTIONS.items() if v['type'] == 'city']
+    for i, c in enumerate(sorted(cities)):
+        print(f"  {c}", end='\t\t' if len(c) < 12 else '\t')
+        if (i + 1) % 4 == 0:
+            print()
+    print()
+
+
+# ============================================================
+# MAIN EXECUTION
+# ============================================================
+
+def main(argv: List[str] = None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Generate static road data for Virginia jurisdictions.')
+    parser.add_argument('jurisdictions', nargs='*',
+                        help='Jurisdiction IDs to process (default: all)')
+    parser.add_argument('--output-dir', default='data',
+                        help='Directory to save output files (default: data)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Jurisdictions to fetch concurrently (1 = sequential)')
+    parser.add_argument('--procs', type=int, default=None,
+                        help='Processes that build and write roads while fetching continues (0 = none)')
+    parser.add_argument('--extract', metavar='PATH',
+                        help='Read roads from a local .osm.pbf/.osm extract instead of Overpass')
+    parser.add_argument('--stream', action='store_true',
+                        help='Parse and write responses incrementally to keep memory flat')
+    parser.add_argument('--no-binary', action='store_true',
+                        help='Skip the binary road files')
+    parser.add_argument('--no-lod', action='store_true',
+                        help='Skip the simplified level-of-detail files')
+    parser.add_argument('--no-tiles', action='store_true',
+                        help='Skip the shared spatial tiles')
+    parser.add_argument('--no-merge', action='store_true',
+                        help='Keep every OSM way as its own road instead of joining continuing segments')
+    parser.add_argument('--no-indexes', action='store_true',
+                        help='Skip the statewide search index and functional-class mileage tables')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip jurisdictions that have not changed since the last run')
+    parser.add_argument('--no-shared-fetch', action='store_true',
+                        help='Fetch cities inside counties separately instead of sharing one download')
+    parser.add_argument('--no-batch', action='store_true',
+                        help='Give every small jurisdiction its own Overpass query')
+    parser.add_argument('--profile', action='store_true',
+                        help='Keep cProfile/tracemalloc dumps of the slowest jurisdictions in the metrics dir')
+    parser.add_argument('--metrics-dir', default=None,
+                        help=f"Where to write run metrics (default: {CONFIG['metrics_dir']})")
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Redo jurisdictions an interrupted run already finished')
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--offline', action='store_true',
+                             help='Only use cached Overpass responses, never the network')
+    cache_group.add_argument('--refresh', action='store_true',
+                             help='Ignore cached responses and fetch everything again')
+    cache_group.add_argument('--no-cache', action='store_true',
+                             help='Neither read nor write the response cache')
+    args = parser.parse_args(argv)
+
+    if args.stream:
+        CONFIG['streaming'] = True
+    if args.procs is not None:
+        CONFIG['process_workers'] = args.procs
+    if args.no_binary:
+        CONFIG['write_binary'] = False
+    if args.no_lod:
+        CONFIG['lod_levels'] = []
+    if args.no_tiles:
+        CONFIG['write_tiles'] = False
+    if args.no_merge:
+        CONFIG['merge_segments'] = False
+    if args.no_indexes:
+        CONFIG['write_indexes'] = False
+    if args.no_resume:
+        CONFIG['resume'] = False
+    if args.profile:
+        CONFIG['profile'] = True
+    if args.metrics_dir:
+        CONFIG['metrics_dir'] = args.metrics_dir
+    if args.no_shared_fetch:
+        CONFIG['shared_fetch'] = False
+    if args.no_batch:
+        CONFIG['batch_queries'] = False
+    if args.offline:
+        CONFIG['cache_mode'] = 'offline'
+    elif args.refresh:
+        CONFIG['cache_mode'] = 'refresh'
+    elif args.no_cache:
+        CONFIG['cache_enabled'] = False
+
+    if args.extract:
+        return generate_from_extract(args.extract, args.output_dir, args.jurisdictions)
+    return generate_all_data(args.output_dir, args.jurisdictions, max_workers=args.jobs,
+                             incremental=args.incremental)
+
+
+if __name__ == '__main__':
+    if 'ipykernel' in sys.modules:
+        # Pasted into a Colab/Jupyter cell: argv holds the kernel's own
+        # arguments, so process all jurisdictions with the defaults
+        generate_all_data()
+    else:
+        main()
@@ -0,0 +1,32 @@
+"""
+Shared setup for the road data generator tests.
+
+The generator is a single script (scripts/generate_road_data_colab.py)
+configured through the module-level CONFIG dict, so every test gets its own
+copy of CONFIG with the cache and metrics directories under tmp_path.
+"""
+
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+import generate_road_data_colab as gen  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch, tmp_path):
+    """A private copy of the generator's CONFIG for one test."""
+    config = copy.deepcopy(gen.CONFIG)
+    config.update({
+        'cache_dir': str(tmp_path / 'cache'),
+        'metrics_dir': str(tmp_path / 'metrics'),
+        'stream_dir': None,
+    })
+    monkeypatch.setattr(gen, 'CONFIG', config)
+    monkeypatch.setattr(gen, '_response_cache', None)
+    return config
@@ -0,0 +1,109 @@
+"""Offline extract ingestion (--extract) against the small fixtures/norton.osm extract."""
+
+import gzip
+import json
+import os
+import shutil
+
+import pytest
+
+from conftest import FIXTURES, gen
+
+NORTON_OSM = os.path.join(FIXTURES, 'norton.osm')
+
+# Roads in the fixture, as process_road_data writes them
+PARK_AVENUE = {
+    'id': 1001, 'name': 'Park Avenue', 'highway': 'primary', 'funcClass': '3',
+    'ref': 'US 23 Business', 'lanes': '2', 'maxspeed': '35 mph', 'surface': '',
+    'coords': [[36.93, -82.64], [36.931, -82.635], [36.932, -82.63]],
+}
+MAIN_STREET = {
+    'id': 1002, 'name': 'Main Street', 'highway': 'tertiary', 'funcClass': '5',
+    'ref': '', 'lanes': '', 'maxspeed': '', 'surface': 'asphalt',
+    'coords': [[36.94, -82.605], [36.941, -82.598], [36.942, -82.59]],
+}
+COEBURN_ROAD = {
+    'id': 1004, 'name': 'Coeburn Road', 'highway': 'secondary', 'funcClass': '4',
+    'ref': '', 'lanes': '', 'maxspeed': '', 'surface': '',
+    'coords': [[36.95, -82.46], [36.952, -82.45]],
+}
+
+
+def extract_path(kind: str, tmp_path) -> str:
+    """The fixture as an .osm, .osm.gz or .osm.pbf file."""
+    if kind == 'osm':
+        return NORTON_OSM
+    if kind == 'osm.gz':
+        path = str(tmp_path / 'norton.osm.gz')
+        with open(NORTON_OSM, 'rb') as src, gzip.open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        return path
+
+    osmium = pytest.importorskip('osmium')
+    path = str(tmp_path / 'norton.osm.pbf')
+    with osmium.SimpleWriter(path) as writer:
+        for obj in osmium.FileProcessor(NORTON_OSM):
+            writer.add(obj)
+    return path
+
+
+def assert_same_coords(coords, expected):
+    assert len(coords) == len(expected)
+    for point, want in zip(coords, expected):
+        assert point == pytest.approx(want, abs=1e-7)
+
+
+def assert_same_road(road, expected):
+    for field, value in expected.items():
+        if field == 'coords':
+            assert_same_coords(road['coords'], value)
+        else:
+            assert road[field] == value, field
+
+
+@pytest.mark.parametrize('kind', ['osm', 'osm.gz', 'osm.pbf'])
+def test_extract_ways_in_bounds(kind, tmp_path):
+    norton = gen.JURISDICTIONS['norton']['bbox']
+    ways = {way_id: (node_ids, coords, tags)
+            for way_id, node_ids, coords, tags in gen.iter_extract_ways(extract_path(kind, tmp_path),
+                                                                        bounds=norton)}
+
+    # Footway, landuse, the other county's road and the far interstate are dropped
+    assert sorted(ways) == [1001, 1002]
+    node_ids, coords, tags = ways[1002]
+    assert node_ids == [4, 5, 6]
+    # Crossing the bbox edge keeps the whole way, as an Overpass bbox query does
+    assert_same_coords(coords, MAIN_STREET['coords'])
+    assert tags == {'highway': 'tertiary', 'name': 'Main Street', 'surface': 'asphalt'}
+
+
+@pytest.mark.parametrize('kind', ['osm', 'osm.pbf'])
+def test_generate_from_extract(kind, tmp_path, config):
+    config.update({'write_tiles': False, 'lod_levels': []})
+    output_dir = str(tmp_path / 'data')
+
+    gen.generate_from_extract(extract_path(kind, tmp_path), output_dir, ['norton', 'wise'])
+
+    roads = {}
+    for j_id in ('norton', 'wise'):
+        with open(os.path.join(output_dir, 'roads', f'{j_id}.json')) as f:
+            data = json.load(f)
+        roads[j_id] = {road['id']: road for road in data['roads']}
+        assert data['roadCount'] == len(data['roads'])
+
+    assert sorted(roads['norton']) == [1001, 1002]
+    assert sorted(roads['wise']) == [1001, 1002, 1004]
+    assert_same_road(roads['norton'][1001], PARK_AVENUE)
+    assert_same_road(roads['norton'][1002], MAIN_STREET)
+    assert_same_road(roads['wise'][1004], COEBURN_ROAD)
+    assert roads['norton'][1001]['length'] == pytest.approx(0.57, abs=0.01)
+
+    with open(os.path.join(output_dir, 'manifest.json')) as f:
+        manifest = json.load(f)['jurisdictions']
+    assert manifest['norton']['roadCount'] == 2
+    assert manifest['wise']['roadCount'] == 3
+
+
+def test_xml_highway_node_ids():
+    node_ids = gen._xml_highway_node_ids(NORTON_OSM, set(gen.HIGHWAY_TYPES))
+    assert list(node_ids) == [1, 2, 3, 4, 5, 6, 9, 10, 12, 13]
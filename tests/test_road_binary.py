@@ -0,0 +1,97 @@
+"""roads/<id>.bin round trips through read_road_binary/validate_road_binary."""
+
+import copy
+import os
+
+import pytest
+
+from conftest import gen
+from benchmark_road_data import synthetic_ways
+
+
+@pytest.fixture
+def ways():
+    return synthetic_ways(300, bbox=gen.JURISDICTIONS['norton']['bbox'], seed=7)
+
+
+def write_binary(data, tmp_path, coord_scale=None) -> str:
+    path = str(tmp_path / 'norton.bin')
+    writer = gen.RoadBinaryWriter(coord_scale)
+    for road in data['roads']:
+        writer.add(road)
+    writer.write(path, data)
+    return path
+
+
+def assert_round_trip(data, path, coord_scale):
+    assert gen.validate_road_binary(path, data) == []
+
+    decoded = gen.read_road_binary(path)
+    for key in ('jurisdiction', 'roadCount', 'totalMiles', 'fcBreakdown'):
+        assert decoded[key] == data[key]
+    for got, want in zip(decoded['roads'], data['roads']):
+        assert got['id'] == want['id']
+        assert got.get('wayIds') == want.get('wayIds')
+        for field in gen.BINARY_STRING_FIELDS + ['funcClass']:
+            assert got[field] == want[field]
+        assert len(got['coords']) == len(want['coords'])
+        for point, expected in zip(got['coords'], want['coords']):
+            assert point == pytest.approx(expected, abs=0.5 / coord_scale + 1e-9)
+
+
+def test_plain_roads_round_trip(ways, tmp_path, config):
+    data = gen.process_road_data({'elements': ways}, 'norton')
+    os.makedirs(os.path.join(str(tmp_path), 'roads'))
+    gen.write_road_binary(data, 'norton', str(tmp_path))
+    path = os.path.join(str(tmp_path), 'roads', 'norton.bin')
+
+    assert not any('wayIds' in road for road in data['roads'])
+    assert_round_trip(data, path, config['binary_coord_scale'])
+
+
+def test_merged_roads_round_trip(ways, tmp_path, config):
+    pairs = list(gen.merge_road_segments(gen.iter_roads(ways)))
+    data = gen.process_road_data(None, 'norton', pairs)
+    path = write_binary(data, tmp_path)
+
+    merged = [road for road in data['roads'] if 'wayIds' in road]
+    assert merged and len(data['roads']) < len(ways)
+    assert_round_trip(data, path, config['binary_coord_scale'])
+
+
+def test_tolerance_follows_the_files_coord_scale(ways, tmp_path):
+    data = gen.process_road_data({'elements': ways}, 'norton')
+    path = write_binary(data, tmp_path, coord_scale=1000)
+
+    # Off by up to 0.0005 degrees, far more than the default scale allows
+    assert gen.read_road_binary_header(path)['coordScale'] == 1000
+    assert_round_trip(data, path, 1000)
+
+    moved = copy.deepcopy(data)
+    moved['roads'][0]['coords'][0][0] += 0.002
+    problems = gen.validate_road_binary(path, moved)
+    assert len(problems) == 1
+    assert problems[0].startswith(f"road {data['roads'][0]['id']} point off by more than 0.0005")
+
+
+def test_mismatched_way_ids_are_reported(ways, tmp_path):
+    data = gen.process_road_data(None, 'norton', list(gen.merge_road_segments(gen.iter_roads(ways))))
+    unmerged = copy.deepcopy(data)
+    road = next(road for road in unmerged['roads'] if 'wayIds' in road)
+    way_ids = road.pop('wayIds')
+    expected = f"road {road['id']} wayIds: {way_ids!r} != None"
+
+    # wayIds in the file but not in the data...
+    assert gen.validate_road_binary(write_binary(data, tmp_path), unmerged) == [expected]
+    # ...and in the data but not in the file
+    assert gen.validate_road_binary(write_binary(unmerged, tmp_path), data) == \
+        [f"road {road['id']} wayIds: None != {way_ids!r}"]
+
+
+def test_not_a_road_binary(tmp_path):
+    path = tmp_path / 'norton.bin'
+    path.write_bytes(b'{"roads": []}')
+    with pytest.raises(ValueError):
+        gen.read_road_binary(str(path))
+    with pytest.raises(ValueError):
+        gen.read_road_binary_header(str(path))
@@ -0,0 +1,250 @@
+"""
+Server health tracking, circuit breaking and slot checks against local
+stand-in Overpass servers (benchmark_road_data.StandInOverpass) simulating
+healthy, slow, overloaded and dead mirrors.
+"""
+
+import time
+
+import pytest
+
+from conftest import gen
+from benchmark_road_data import StandInOverpass
+
+QUERY = gen.build_overpass_query(gen.JURISDICTIONS['norton']['bbox'])
+
+
+def status_busy(seconds: int) -> str:
+    """/api/status of a mirror whose query slots are all taken for ``seconds``."""
+    return (
+        'Connected as: 1\n'
+        'Current time: 2026-01-01T00:00:00Z\n'
+        'Rate limit: 2\n'
+        '0 slots available now.\n'
+        f'Slot available after: 2026-01-01T00:00:00Z, in {seconds} seconds.\n'
+        f'Slot available after: 2026-01-01T00:00:00Z, in {seconds + 60} seconds.\n'
+        'Currently running queries (pid, space limit, time limit, start time):\n'
+    )
+
+
+@pytest.fixture(autouse=True)
+def fast_config(config):
+    config.update({
+        'timeout': 5,
+        'retry_delay': 0,
+        'max_retries': 3,
+        'min_request_interval': 0,
+        'circuit_breaker_threshold': 2,
+        'circuit_breaker_base_delay': 0.4,
+        'circuit_breaker_max_delay': 10,
+        'status_check': False,
+    })
+    return config
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server = StandInOverpass(ways_per_sq_degree=2000, **kwargs).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def open_delay(health: gen.ServerHealthTracker, url: str) -> float:
+    return health._get(url)['open_until'] - time.monotonic()
+
+
+def test_circuit_opens_after_repeated_failures(servers):
+    dead = servers(dead=True)
+    health = gen.ServerHealthTracker()
+
+    assert gen.fetch_with_retry(dead.url, QUERY, health=health) is None
+    # The circuit opened at the second consecutive failure, so the third attempt was not made
+    assert dead.requests == 2
+    assert health.is_open(dead.url)
+    assert 0.2 - 0.05 <= open_delay(health, dead.url) <= 0.4
+
+    stats = health.snapshot()[dead.url]
+    assert stats['failures'] == 2 and stats['circuitOpen']
+
+
+def test_open_circuit_backs_off_exponentially_with_jitter(servers, config):
+    dead = servers(dead=True)
+    delays = []
+    for _ in range(8):
+        health = gen.ServerHealthTracker()
+        for trip in range(1, 4):
+            for _ in range(config['circuit_breaker_threshold']):
+                health.record_failure(dead.url)
+            backoff = config['circuit_breaker_base_delay'] * 2 ** (trip - 1)
+            delay = open_delay(health, dead.url)
+            # Equal jitter: between half and all of the doubled backoff
+            assert backoff / 2 - 0.05 <= delay <= backoff
+            delays.append(delay)
+
+    assert len({round(d, 3) for d in delays}) > 3
+
+
+def test_circuit_closes_after_a_successful_probe(servers):
+    mirror = servers(dead=True)
+    scheduler = gen.ServerScheduler([mirror.url], per_server_concurrency=2, min_request_interval=0)
+    health = scheduler.health
+
+    assert gen.fetch_with_retry(mirror.url, QUERY, health=health) is None
+    assert health.is_open(mirror.url)
+
+    # While open the scheduler holds the server back until the circuit expires
+    started = time.monotonic()
+    with scheduler.slot() as server:
+        assert server == mirror.url
+        assert time.monotonic() - started >= 0.15
+        # Half-open: one probe request at a time
+        assert health.is_half_open(mirror.url)
+        assert scheduler._limit(mirror.url) == 1
+
+        mirror.dead = False
+        data = gen.fetch_with_retry(server, QUERY, health=health)
+
+    assert data and data['elements']
+    assert not health.is_open(mirror.url)
+    assert not health.is_half_open(mirror.url)
+    assert scheduler._limit(mirror.url) == 2
+
+
+def test_dead_and_unreachable_mirrors_are_skipped(servers):
+    dead = servers(dead=True)
+    unreachable = servers()
+    unreachable.stop()
+    healthy = servers()
+    scheduler = gen.ServerScheduler([dead.url, unreachable.url, healthy.url], min_request_interval=0)
+
+    data = gen.fetch_overpass_network(QUERY, scheduler, 'norton')
+    assert data and data['elements']
+    assert healthy.requests == 1
+
+    # The failed mirrors' circuits are open, so the next query goes straight to the healthy one
+    assert scheduler.health.is_open(dead.url) and scheduler.health.is_open(unreachable.url)
+    dead_requests = dead.requests
+    assert gen.fetch_overpass_network(QUERY, scheduler, 'norton')
+    assert dead.requests == dead_requests
+    assert healthy.requests == 2
+
+
+def test_slow_mirror_ranks_behind_fast_one(servers):
+    slow = servers(latency=0.3)
+    fast = servers()
+    scheduler = gen.ServerScheduler([slow.url, fast.url], min_request_interval=0)
+
+    for url in (slow.url, fast.url):
+        assert gen.fetch_with_retry(url, QUERY, health=scheduler.health)
+    assert scheduler.health.expected_completion(slow.url) > scheduler.health.expected_completion(fast.url)
+
+    with scheduler.slot() as server:
+        assert server == fast.url
+
+
+@pytest.mark.parametrize('failure', ['http429', 'http504'])
+def test_overloaded_mirror_is_not_retried(servers, failure):
+    overloaded = servers(failure_rate=1.0, failures=[failure])
+    healthy = servers()
+    scheduler = gen.ServerScheduler([overloaded.url, healthy.url], min_request_interval=0)
+    health = scheduler.health
+
+    assert gen.fetch_with_retry(overloaded.url, QUERY, health=health) is None
+    # Overloaded: give up on the server at once instead of using up max_retries
+    assert overloaded.requests == 1
+
+    stats = health.snapshot()[overloaded.url]
+    if failure == 'http429':
+        assert stats['throttled'] == 1
+        # Throttling opens the circuit at once
+        assert stats['circuitOpen']
+    else:
+        assert stats['overloaded'] == 1
+        assert not stats['circuitOpen']
+
+    data = gen.fetch_overpass_network(QUERY, scheduler, 'norton')
+    assert data and data['elements']
+    assert healthy.requests == 1
+
+
+def test_throttled_mirror_is_backed_off(servers):
+    throttled = servers(failure_rate=1.0, failures=['http429'])
+    scheduler = gen.ServerScheduler([throttled.url], min_request_interval=0)
+
+    assert gen.fetch_overpass_network(QUERY, scheduler, 'norton') is None
+    assert throttled.requests == 1
+    delay = open_delay(scheduler.health, throttled.url)
+    assert delay > 0.15
+
+    # The next query waits for the circuit to expire before sending anything
+    throttled.failure_rate = 0.0
+    started = time.monotonic()
+    assert gen.fetch_overpass_network(QUERY, scheduler, 'norton')
+    assert time.monotonic() - started >= delay - 0.05
+    assert throttled.requests == 2
+
+
+@pytest.mark.parametrize('text, wait', [
+    (StandInOverpass.STATUS_FREE, 0.0),
+    (status_busy(120), 120.0),
+    ('Connected as: 1\nRate limit: 0\n', 0.0),
+    ('Connected as: 1\nRate limit: 2\nSlot available after: 2026-01-01T00:00:00Z, in -3 seconds.\n', 0.0),
+    ('<html>Not an Overpass server</html>', None),
+])
+def test_parse_overpass_status(text, wait):
+    assert gen.parse_overpass_status(text) == wait
+
+
+def test_busy_mirror_is_deferred_to_a_free_one(servers, config):
+    config.update({'status_check': True, 'max_slot_wait': 5})
+    busy = servers(status_text=status_busy(120))
+    free = servers()
+    scheduler = gen.ServerScheduler([busy.url, free.url], min_request_interval=0)
+
+    data = gen.fetch_overpass_network(QUERY, scheduler, 'norton')
+    assert data and data['elements']
+    # The busy mirror was asked for its slots but got no query
+    assert busy.status_requests == 1
+    assert busy.requests == 0
+    assert free.requests == 1
+
+
+def test_short_slot_wait_delays_the_query(servers, config):
+    config.update({'status_check': True, 'max_slot_wait': 5})
+    mirror = servers(status_text=status_busy(1))
+    scheduler = gen.ServerScheduler([mirror.url], min_request_interval=0)
+
+    started = time.monotonic()
+    assert gen.fetch_overpass_network(QUERY, scheduler, 'norton')
+    assert time.monotonic() - started >= 1.0
+    assert mirror.requests == 1
+
+
+def test_busy_everywhere_waits_for_the_first_free_slot(servers, config):
+    config.update({'status_check': True, 'max_slot_wait': 0.5})
+    later = servers(status_text=status_busy(3))
+    sooner = servers(status_text=status_busy(1))
+    scheduler = gen.ServerScheduler([later.url, sooner.url], min_request_interval=0)
+
+    # Both are deferred, then the query waits for the earliest slot
+    started = time.monotonic()
+    assert gen.fetch_overpass_network(QUERY, scheduler, 'norton')
+    assert 1.0 <= time.monotonic() - started < 3.0
+    assert (later.requests, sooner.requests) == (0, 1)
+
+
+def test_dead_status_page_does_not_block_queries(servers, config):
+    config.update({'status_check': True})
+    mirror = servers()
+    scheduler = gen.ServerScheduler([mirror.url], min_request_interval=0)
+    mirror.status_text = ''
+
+    assert scheduler.health.check_status(mirror.url) is None
+    assert gen.fetch_overpass_network(QUERY, scheduler, 'norton')
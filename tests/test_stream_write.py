@@ -0,0 +1,40 @@
+"""write_road_data_stream: streamed roads/<id>.json output."""
+
+import json
+import os
+
+import pytest
+
+from conftest import gen
+from benchmark_road_data import synthetic_ways
+
+
+def test_stream_matches_save_road_data(tmp_path):
+    ways = synthetic_ways(50, bbox=gen.JURISDICTIONS['norton']['bbox'], seed=3)
+    data = gen.process_road_data({'elements': ways}, 'norton')
+
+    summary = gen.write_road_data_stream(gen.iter_roads(ways), 'norton', str(tmp_path))
+    with open(tmp_path / 'roads' / 'norton.json') as f:
+        streamed = json.load(f)
+
+    for key in ('roadCount', 'totalMiles', 'fcBreakdown'):
+        assert summary[key] == streamed[key] == data[key]
+    assert streamed['roads'] == data['roads']
+
+
+def test_failed_stream_leaves_no_temp_file(tmp_path):
+    ways = synthetic_ways(20, bbox=gen.JURISDICTIONS['norton']['bbox'], seed=3)
+    gen.write_road_data_stream(gen.iter_roads(ways), 'norton', str(tmp_path))
+    with open(tmp_path / 'roads' / 'norton.json') as f:
+        before = f.read()
+
+    def truncated():
+        yield from list(gen.iter_roads(ways))[:5]
+        raise ValueError('truncated response')
+
+    with pytest.raises(ValueError):
+        gen.write_road_data_stream(truncated(), 'norton', str(tmp_path))
+
+    assert os.listdir(tmp_path / 'roads') == ['norton.json']
+    with open(tmp_path / 'roads' / 'norton.json') as f:
+        assert f.read() == before